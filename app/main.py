@@ -26,7 +26,7 @@ from core.web_search import search_and_format
 from core.model_router import ModelRouter, ModelMapping, Intent, classify_intent
 from core.pipeline import (
     PipelineScheduler, build_maintenance_pipeline,
-    build_document_pipeline, build_memory_pipeline,
+    build_document_pipeline, build_memory_pipeline, conversations_signal,
 )
 from app.vision import (
     VISION_ONLY_TAGS, MULTILINGUAL_VISION, VISION_PRIORITY,
@@ -147,6 +147,7 @@ pipeline_scheduler.register(
 pipeline_scheduler.register(
     "memory_refresh", build_memory_pipeline(),
     interval_seconds=30 * 60,    # ogni 30 minuti
+    signals={"conversations": conversations_signal},  # solo se ci sono novità
 )
 pipeline_scheduler.start()
 logger.info("Pipeline Scheduler: avviato (maintenance=6h, memory=30min)")
@@ -199,7 +200,7 @@ def api_status():
         'available_models': user_visible_models(ai_engine) if ollama_ok else [],
         'router': {
             'enabled': ROUTER_ENABLED,
-            'models': model_router.mapping.__dict__ if ROUTER_ENABLED and model_router else None,
+            'models': model_router.mapping.to_dict() if ROUTER_ENABLED and model_router else None,
             'warm_model': model_router.warm_model if ROUTER_ENABLED and model_router else None,
         },
         'pipeline_scheduler': pipeline_scheduler.get_status(),
@@ -14,9 +14,31 @@ import re
 import config
 from core.memory import ConversationMemory
 
+# orjson (opzionale): parser/serializer JSON in Rust, ~3-5x più veloce di json
+try:
+    import orjson
+    ORJSON_AVAILABLE = True
+except ImportError:
+    orjson = None
+    ORJSON_AVAILABLE = False
+
 logger = logging.getLogger(__name__)
 
 
+def _json_loads(data):
+    """Decodifica JSON da bytes/str, usando orjson se disponibile."""
+    if ORJSON_AVAILABLE:
+        return orjson.loads(data)
+    return json.loads(data)
+
+
+def _json_dumps(obj) -> str:
+    """Serializza in JSON UTF-8 (equivalente a ensure_ascii=False)."""
+    if ORJSON_AVAILABLE:
+        return orjson.dumps(obj).decode('utf-8')
+    return json.dumps(obj, ensure_ascii=False)
+
+
 class ContextManager:
     """Gestisce il contesto e la compressione automatica dei messaggi"""
     
@@ -332,6 +354,11 @@ class KnowledgeBase:
         self._db_path = os.path.join(db_dir, self._DEFAULT_DB_NAME)
         self._lock = threading.RLock()
         self._conn = None
+        # Lista interessi già decodificata (None = da rileggere dal DB),
+        # valida finché PRAGMA data_version non cambia: altre istanze sullo
+        # stesso knowledge.db (pipeline memoria, knowledge_cli) la invalidano
+        self._interests_cache: Optional[List[str]] = None
+        self._interests_version: Optional[int] = None
 
         self._connect()
         self._init_tables()
@@ -346,17 +373,20 @@ class KnowledgeBase:
 
     def _init_tables(self):
         c = self._conn
+        # kv e topics sono letti sempre per chiave testuale: WITHOUT ROWID
+        # li memorizza direttamente nel B-tree della PK (un solo lookup).
+        # facts resta rowid-table perché facts_fts usa content_rowid=id.
         c.execute("""
             CREATE TABLE IF NOT EXISTS kv (
                 key   TEXT PRIMARY KEY,
                 value TEXT NOT NULL
-            )
+            ) WITHOUT ROWID
         """)
         c.execute("""
             CREATE TABLE IF NOT EXISTS topics (
                 name  TEXT PRIMARY KEY,
                 count INTEGER NOT NULL DEFAULT 0
-            )
+            ) WITHOUT ROWID
         """)
         c.execute("""
             CREATE TABLE IF NOT EXISTS facts (
@@ -370,11 +400,12 @@ class KnowledgeBase:
             CREATE VIRTUAL TABLE IF NOT EXISTS facts_fts
             USING fts5(content, content=facts, content_rowid=id)
         """)
+        # L'indicizzazione FTS degli INSERT è fatta esplicitamente in
+        # add_fact (niente trigger da eseguire per ogni riga). I DB creati
+        # con versioni precedenti hanno ancora il trigger: va rimosso,
+        # altrimenti ogni fatto verrebbe indicizzato due volte.
         c.executescript("""
-            CREATE TRIGGER IF NOT EXISTS kb_facts_ai AFTER INSERT ON facts BEGIN
-                INSERT INTO facts_fts(rowid, content)
-                VALUES (new.id, new.content);
-            END;
+            DROP TRIGGER IF EXISTS kb_facts_ai;
             CREATE TRIGGER IF NOT EXISTS kb_facts_ad AFTER DELETE ON facts BEGIN
                 INSERT INTO facts_fts(facts_fts, rowid, content)
                 VALUES ('delete', old.id, old.content);
@@ -399,18 +430,16 @@ class KnowledgeBase:
             if row[0] > 0:
                 return
         try:
-            with open(self._json_path, 'r', encoding='utf-8') as f:
-                old = json.load(f)
+            with open(self._json_path, 'rb') as f:
+                old = _json_loads(f.read())
             profile = old.get('user_profile', {})
             for key in ('name', 'language', 'created_at'):
                 if profile.get(key):
                     self._set_kv(key, str(profile[key]))
             if profile.get('interests'):
-                self._set_kv('interests', json.dumps(profile['interests'],
-                                                     ensure_ascii=False))
+                self._set_kv('interests', _json_dumps(profile['interests']))
             if profile.get('expertise'):
-                self._set_kv('expertise', json.dumps(profile['expertise'],
-                                                     ensure_ascii=False))
+                self._set_kv('expertise', _json_dumps(profile['expertise']))
             for topic, count in old.get('topics_discussed', {}).items():
                 self._set_topic(topic, count)
             for fact in old.get('learned_facts', []):
@@ -439,6 +468,8 @@ class KnowledgeBase:
                 "INSERT OR REPLACE INTO kv (key, value) VALUES (?, ?)",
                 (key, value))
             self._conn.commit()
+            if key == 'interests':
+                self._interests_cache = None
 
     def _get_kv(self, key, default=None):
         with self._lock:
@@ -446,6 +477,22 @@ class KnowledgeBase:
                 "SELECT value FROM kv WHERE key = ?", (key,)).fetchone()
         return row[0] if row else default
 
+    def _get_interests(self):
+        """Lista interessi, decodificata dal JSON solo quando cambia.
+
+        La cache viene invalidata da _set_kv('interests', ...) e da ogni
+        commit di altre connessioni sul DB (PRAGMA data_version).
+        Restituisce una copia: i chiamanti possono modificarla liberamente.
+        """
+        with self._lock:
+            version = self._conn.execute("PRAGMA data_version").fetchone()[0]
+            if (self._interests_cache is None
+                    or version != self._interests_version):
+                self._interests_cache = _json_loads(
+                    self._get_kv('interests', '[]'))
+                self._interests_version = version
+            return list(self._interests_cache)
+
     def _set_topic(self, name, count):
         with self._lock:
             self._conn.execute(
@@ -464,13 +511,16 @@ class KnowledgeBase:
     def add_fact(self, content, source=""):
         """Aggiunge un fatto alla KB. Restituisce l'ID."""
         now = datetime.now().isoformat()
-        with self._lock:
+        with self._lock, self._conn:
             cur = self._conn.execute(
                 "INSERT INTO facts (content, source, created_at) "
                 "VALUES (?, ?, ?)",
                 (content, source, now))
-            self._conn.commit()
-        return cur.lastrowid
+            fid = cur.lastrowid
+            self._conn.execute(
+                "INSERT INTO facts_fts (rowid, content) VALUES (?, ?)",
+                (fid, content))
+        return fid
 
     def search_facts(self, query, limit=10):
         """Ricerca full-text FTS5 nei fatti. O(log n), ~1-5ms."""
@@ -540,16 +590,16 @@ class KnowledgeBase:
             'birthday': self._get_kv('birthday'),
             'gender': self._get_kv('gender'),
             'job': self._get_kv('job'),
-            'passions': json.loads(self._get_kv('passions', '[]')),
-            'personality': json.loads(self._get_kv('personality', '[]')),
-            'health': json.loads(self._get_kv('health', '[]')),
-            'physical': json.loads(self._get_kv('physical', '[]')),
+            'passions': _json_loads(self._get_kv('passions', '[]')),
+            'personality': _json_loads(self._get_kv('personality', '[]')),
+            'health': _json_loads(self._get_kv('health', '[]')),
+            'physical': _json_loads(self._get_kv('physical', '[]')),
             'family_status': self._get_kv('family_status'),
             'children': self._get_kv('children'),
-            'family_details': json.loads(self._get_kv('family_details', '[]')),
-            'goals': json.loads(self._get_kv('goals', '[]')),
-            'interests': json.loads(self._get_kv('interests', '[]')),
-            'expertise': json.loads(self._get_kv('expertise', '[]')),
+            'family_details': _json_loads(self._get_kv('family_details', '[]')),
+            'goals': _json_loads(self._get_kv('goals', '[]')),
+            'interests': self._get_interests(),
+            'expertise': _json_loads(self._get_kv('expertise', '[]')),
             'language': self._get_kv('language', 'italiano'),
             'created_at': self._get_kv('created_at',
                                        datetime.now().isoformat()),
@@ -578,11 +628,16 @@ class KnowledgeBase:
     # -- Helpers ---------------------------------------------------------------
 
     _RE_ARTICLES = re.compile(r"^(?:il|la|lo|le|i|gli|un|uno|una|l['\u2019])\s*", re.IGNORECASE)
+    _RE_FILLER_ADVERBS = re.compile(r'^(?:anche|pure|poi)\s+')
+    # Separatori di elenchi: "x e y", "x, y"
+    _RE_LIST_SPLIT = re.compile(r'\s+e\s+|,\s*')
+    _RE_AND_SPLIT = re.compile(r'\s+e\s+')
+    _RE_WORDS = re.compile(r'\w+')
 
     @staticmethod
     def _strip_articles(text):
         """Rimuove articoli italiani iniziali e avverbi superflui."""
-        text = re.sub(r'^(?:anche|pure|poi)\s+', '', text.strip())
+        text = KnowledgeBase._RE_FILLER_ADVERBS.sub('', text.strip())
         return KnowledgeBase._RE_ARTICLES.sub('', text).strip()
 
     # Pre-compiled patterns per performance (riusati ad ogni messaggio)
@@ -727,28 +782,37 @@ class KnowledgeBase:
         if self._TRG_GOAL.search(text):
             self._extract_goals(text)
 
+    _INTEREST_TRIGGERS = (
+        'mi interessa ', 'mi interessano ',
+        'mi piace ', 'mi piacciono ',
+        'la mia passione \u00e8 ', 'la mia passione e ',
+        'sono appassionato di ', 'sono appassionata di ',
+    )
+
     def _extract_interests(self, text):
         text_lower = text.lower()
-        triggers = [
-            'mi interessa ', 'mi interessano ',
-            'mi piace ', 'mi piacciono ',
-            'la mia passione \u00e8 ', 'la mia passione e ',
-            'sono appassionato di ', 'sono appassionata di ',
-        ]
-        current = json.loads(self._get_kv('interests', '[]'))
-        changed = False
-        for trigger in triggers:
+        found = []
+        for trigger in self._INTEREST_TRIGGERS:
             if trigger in text_lower:
                 raw = text_lower.split(trigger, 1)[1].split('.')[0].strip()
-                parts = re.split(r'\s+e\s+|,\s*', raw)
+                parts = self._RE_LIST_SPLIT.split(raw)
                 for part in parts:
                     part = self._strip_articles(part)
-                    if part and len(part) > 2 and part not in current:
-                        current.append(part)
-                        changed = True
-        if changed:
-            self._set_kv('interests',
-                         json.dumps(current, ensure_ascii=False))
+                    if part and len(part) > 2:
+                        found.append(part)
+        if not found:
+            return
+        # Valore corrente letto dal DB (non dalla cache) subito prima della
+        # scrittura: non perde gli interessi aggiunti da altre istanze
+        with self._lock:
+            current = _json_loads(self._get_kv('interests', '[]'))
+            changed = False
+            for part in found:
+                if part not in current:
+                    current.append(part)
+                    changed = True
+            if changed:
+                self._set_kv('interests', _json_dumps(current))
 
     def _extract_gender(self, text):
         """Estrae il sesso/genere da frasi come 'sono un maschio', 'sono una ragazza'."""
@@ -783,29 +847,31 @@ class KnowledgeBase:
                         self._set_kv('job', job)
                         return
 
+    _RE_PASSIONS = [
+        re.compile(r'(?:la\s+mia\s+passione\s+[eè]|le\s+mie\s+passioni\s+sono)\s+(.+?)(?:[.]|$)', re.I),
+        re.compile(r'(?:sono\s+appassionat[oa]\s+di)\s+(.+?)(?:[,.]|$)', re.I),
+        re.compile(r'adoro\s+(.+?)(?:[,.]|$)', re.I),
+        re.compile(r'amo\s+fare\s+(.+?)(?:[,.]|$)', re.I),
+    ]
+    _RE_PASSION_ARTICLES = re.compile(r'^(?:il|la|lo|le|i|gli|l[\'\u2019])\s*')
+
     def _extract_passions(self, text):
         """Estrae passioni (lista, simile a interessi ma più forte)."""
-        patterns = [
-            r'(?:la\s+mia\s+passione\s+[eè]|le\s+mie\s+passioni\s+sono)\s+(.+?)(?:[.]|$)',
-            r'(?:sono\s+appassionat[oa]\s+di)\s+(.+?)(?:[,.]|$)',
-            r'adoro\s+(.+?)(?:[,.]|$)',
-            r'amo\s+fare\s+(.+?)(?:[,.]|$)',
-        ]
-        current = json.loads(self._get_kv('passions', '[]'))
+        current = _json_loads(self._get_kv('passions', '[]'))
         changed = False
-        for pattern in patterns:
-            match = re.search(pattern, text, re.IGNORECASE)
+        for rx in self._RE_PASSIONS:
+            match = rx.search(text)
             if match:
                 raw = match.group(1).strip().lower()
                 # Split su "e" / virgola per separare passioni multiple
-                parts = re.split(r'\s+e\s+|,\s*', raw)
+                parts = self._RE_LIST_SPLIT.split(raw)
                 for passion in parts:
-                    passion = re.sub(r'^(?:il|la|lo|le|i|gli|l[\'\u2019])\s*', '', passion).strip()
+                    passion = self._RE_PASSION_ARTICLES.sub('', passion).strip()
                     if passion and len(passion) > 2 and passion not in current:
                         current.append(passion)
                         changed = True
         if changed:
-            self._set_kv('passions', json.dumps(current, ensure_ascii=False))
+            self._set_kv('passions', _json_dumps(current))
 
     # Tratti personalità normalizzati (maschile singolare)
     _PERS_NORM = {
@@ -837,9 +903,9 @@ class KnowledgeBase:
 
     def _extract_personality(self, text):
         """Estrae tratti di personalità (lista, normalizzati al maschile)."""
-        current = json.loads(self._get_kv('personality', '[]'))
+        current = _json_loads(self._get_kv('personality', '[]'))
         changed = False
-        words = set(re.findall(r'\w+', text.lower()))
+        words = set(self._RE_WORDS.findall(text.lower()))
         for kw in words & self._PERS_KW:
             norm = self._PERS_NORM.get(kw, kw)
             if norm not in current:
@@ -848,14 +914,14 @@ class KnowledgeBase:
         # Frasi "mi considero / mi definisco / sono una persona..."
         match = self._RE_PERS_PHRASE.search(text)
         if match:
-            parts = [p.strip() for p in re.split(r'\s+e\s+', match.group(1).lower())]
+            parts = [p.strip() for p in self._RE_AND_SPLIT.split(match.group(1).lower())]
             for desc in parts:
                 norm = self._PERS_NORM.get(desc, desc)
                 if norm and len(norm) > 2 and len(norm) < 60 and norm not in current:
                     current.append(norm)
                     changed = True
         if changed:
-            self._set_kv('personality', json.dumps(current, ensure_ascii=False))
+            self._set_kv('personality', _json_dumps(current))
 
     _RE_HEALTH = [
         re.compile(r'soffro\s+di\s+(.+?)(?:[,.]|$)', re.I),
@@ -867,7 +933,7 @@ class KnowledgeBase:
 
     def _extract_health(self, text):
         """Estrae informazioni sulla salute (lista)."""
-        current = json.loads(self._get_kv('health', '[]'))
+        current = _json_loads(self._get_kv('health', '[]'))
         changed = False
         for rx in self._RE_HEALTH:
             match = rx.search(text)
@@ -878,7 +944,7 @@ class KnowledgeBase:
                         current.append(info)
                         changed = True
         if changed:
-            self._set_kv('health', json.dumps(current, ensure_ascii=False))
+            self._set_kv('health', _json_dumps(current))
 
     def _extract_physical(self, text):
         """Estrae caratteristiche fisiche (lista, pre-compiled patterns)."""
@@ -894,12 +960,12 @@ class KnowledgeBase:
                 else:  # altezza
                     traits.append(f"altezza: {val}")
         if traits:
-            current = json.loads(self._get_kv('physical', '[]'))
+            current = _json_loads(self._get_kv('physical', '[]'))
             for t in traits:
                 cat = t.split(':')[0]
                 current = [c for c in current if not c.startswith(cat + ':')]
                 current.append(t)
-            self._set_kv('physical', json.dumps(current, ensure_ascii=False))
+            self._set_kv('physical', _json_dumps(current))
 
     _RE_FAMILY_MEMBER = re.compile(
         r'(?:ho|(?:il\s+)?mi[oa])\s+'
@@ -937,14 +1003,14 @@ class KnowledgeBase:
         # Relazioni familiari
         match = self._RE_FAMILY_MEMBER.search(text)
         if match:
-            family_items = json.loads(self._get_kv('family_details', '[]'))
+            family_items = _json_loads(self._get_kv('family_details', '[]'))
             relation = match.group(1).lower()
             name = match.group(2) or ''
             entry = f"{relation}: {name}" if name else relation
             if entry not in family_items:
                 family_items.append(entry)
                 self._set_kv('family_details',
-                             json.dumps(family_items, ensure_ascii=False))
+                             _json_dumps(family_items))
 
     _RE_GOALS = [
         re.compile(r'(?:il\s+mio\s+)?(?:ob[bi]iettivo|sogno|traguardo|aspirazione|ambizione)\s+[eè]\s+(.+?)(?:[,.]|$)', re.I),
@@ -958,7 +1024,7 @@ class KnowledgeBase:
 
     def _extract_goals(self, text):
         """Estrae obiettivi personali (lista)."""
-        current = json.loads(self._get_kv('goals', '[]'))
+        current = _json_loads(self._get_kv('goals', '[]'))
         changed = False
         for rx in self._RE_GOALS:
             match = rx.search(text)
@@ -969,7 +1035,7 @@ class KnowledgeBase:
                         current.append(goal)
                         changed = True
         if changed:
-            self._set_kv('goals', json.dumps(current, ensure_ascii=False))
+            self._set_kv('goals', _json_dumps(current))
 
     def _count_topics(self, text):
         topic_map = {
@@ -1009,16 +1075,16 @@ class KnowledgeBase:
         job = self._get_kv('job')
         if job:
             context_parts.append(f"Lavoro: {job}")
-        passions = json.loads(self._get_kv('passions', '[]'))
+        passions = _json_loads(self._get_kv('passions', '[]'))
         if passions:
             context_parts.append(f"Passioni: {', '.join(passions[:5])}")
-        personality = json.loads(self._get_kv('personality', '[]'))
+        personality = _json_loads(self._get_kv('personality', '[]'))
         if personality:
             context_parts.append(f"Personalit\u00e0: {', '.join(personality[:5])}")
-        health = json.loads(self._get_kv('health', '[]'))
+        health = _json_loads(self._get_kv('health', '[]'))
         if health:
             context_parts.append(f"Salute: {', '.join(health[:5])}")
-        physical = json.loads(self._get_kv('physical', '[]'))
+        physical = _json_loads(self._get_kv('physical', '[]'))
         if physical:
             context_parts.append(f"Caratteristiche fisiche: {', '.join(physical[:5])}")
         family_status = self._get_kv('family_status')
@@ -1028,13 +1094,13 @@ class KnowledgeBase:
             if children:
                 fam_str += f", {children} figli" if children != '1' else ", 1 figlio"
             context_parts.append(f"Stato famiglia: {fam_str}")
-        family_details = json.loads(self._get_kv('family_details', '[]'))
+        family_details = _json_loads(self._get_kv('family_details', '[]'))
         if family_details:
             context_parts.append(f"Familiari: {', '.join(family_details[:5])}")
-        goals = json.loads(self._get_kv('goals', '[]'))
+        goals = _json_loads(self._get_kv('goals', '[]'))
         if goals:
             context_parts.append(f"Obiettivi: {'; '.join(goals[:3])}")
-        interests = json.loads(self._get_kv('interests', '[]'))
+        interests = self._get_interests()
         if interests:
             context_parts.append(f"Interessi: {', '.join(interests[:5])}")
         topics = self._get_topics()
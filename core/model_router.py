@@ -10,6 +10,7 @@ Design:
   - Fallback al modello di default se quello specializzato non è installato
 """
 
+import functools
 import logging
 import re
 import threading
@@ -32,8 +33,10 @@ class Intent(Enum):
 
 
 # --- Pattern per rilevamento codice ---
-# Keyword esplicite di programmazione / richiesta codice
-_CODE_KEYWORDS = re.compile(
+# Keyword esplicite di programmazione / richiesta codice.
+# La regex è grande: viene compilata al primo uso, non all'import del modulo
+# (chi importa solo ModelMapping/RouteResult non paga il costo).
+_CODE_KEYWORDS_PATTERN = (
     r'\b(?:'
     # Richieste esplicite
     r'scrivi\s+(?:un\s+)?(?:codice|script|programma|funzione|classe|metodo)'
@@ -49,10 +52,16 @@ _CODE_KEYWORDS = re.compile(
     r'|import|require|from\s+\w+\s+import|def\s+\w+|class\s+\w+'
     r'|git\b|commit|branch|merge|docker|container|pip|npm|yarn'
     r'|algoritmo|struttura\s+dati|ricorsione|sorting|binary\s+search'
-    r')\b',
-    re.IGNORECASE,
+    r')\b'
 )
 
+
+@functools.cache
+def _get_code_keywords() -> "re.Pattern[str]":
+    """Regex delle keyword di programmazione, compilata una sola volta."""
+    return re.compile(_CODE_KEYWORDS_PATTERN, re.IGNORECASE)
+
+
 # Code fence (```python, ```js, ecc.) o blocchi di codice inline
 _CODE_FENCE = re.compile(r'```\w*\s*\n|`[^`]+`')
 
@@ -60,12 +69,16 @@ _CODE_FENCE = re.compile(r'```\w*\s*\n|`[^`]+`')
 _CODE_INDENT = re.compile(r'^\s{2,}(?:def |for |if |class |return |import )', re.MULTILINE)
 
 
+@functools.lru_cache(maxsize=1024)
 def classify_intent(message: str, *, has_images: bool = False) -> Intent:
     """
     Classifica l'intento dell'utente in modo deterministico.
 
     Priority: VISION > CODE > GENERAL
 
+    Funzione pura → risultati memoizzati (LRU, 1024 voci): i messaggi
+    ripetuti (saluti, domande frequenti) saltano la scansione regex.
+
     Args:
         message: Testo del messaggio utente
         has_images: True se il messaggio contiene immagini allegate
@@ -90,7 +103,7 @@ def classify_intent(message: str, *, has_images: bool = False) -> Intent:
         return Intent.CODE
 
     # Keyword di programmazione
-    if _CODE_KEYWORDS.search(text):
+    if _get_code_keywords().search(text):
         return Intent.CODE
 
     return Intent.GENERAL
@@ -100,7 +113,7 @@ def classify_intent(message: str, *, has_images: bool = False) -> Intent:
 # Router configuration
 # =========================================================================
 
-@dataclass
+@dataclass(slots=True)
 class ModelMapping:
     """Mappa intento → modello Ollama preferito."""
     general: str = "gemma2:9b"
@@ -119,6 +132,14 @@ class ModelMapping:
         """Lista di tutti i modelli configurati (unici)."""
         return list(dict.fromkeys([self.general, self.code, self.vision]))
 
+    def to_dict(self) -> Dict:
+        # Classe con slots: niente __dict__, i campi vanno elencati
+        return {
+            "general": self.general,
+            "code": self.code,
+            "vision": self.vision,
+        }
+
 
 # =========================================================================
 # Model Router
@@ -147,6 +168,8 @@ class ModelRouter:
         self._warm_model: Optional[str] = None
         self._lock = threading.Lock()
         self._installed_cache: Optional[List[str]] = None
+        # Esito di _is_installed per modello (invalidato da refresh_installed)
+        self._installed_lookup: Dict[str, bool] = {}
         self._installed_cache_lock = threading.Lock()
         logger.info(
             "ModelRouter inizializzato: general=%s, code=%s, vision=%s, fallback=%s",
@@ -157,19 +180,27 @@ class ModelRouter:
         """Aggiorna la cache dei modelli installati (chiamata a inizio sessione)."""
         with self._installed_cache_lock:
             self._installed_cache = [m.lower() for m in available_models]
+            self._installed_lookup.clear()
         logger.debug("Cache modelli aggiornata: %d modelli", len(available_models))
 
     def _is_installed(self, model: str) -> bool:
-        """Controlla se un modello è disponibile localmente."""
+        """Controlla se un modello è disponibile localmente.
+
+        L'esito è memoizzato per modello: la scansione della lista installati
+        avviene una sola volta per ogni refresh_installed().
+        """
         with self._installed_cache_lock:
             if self._installed_cache is None:
                 return True  # Se non abbiamo la cache, assumiamo sia installato
-            model_lower = model.lower().split(":")[0]
-            for m in self._installed_cache:
-                m_base = m.split(":")[0]
-                if model_lower == m_base or model.lower() == m:
-                    return True
-            return False
+            found = self._installed_lookup.get(model)
+            if found is None:
+                model_lower = model.lower().split(":")[0]
+                found = any(
+                    model_lower == m.split(":")[0] or model.lower() == m
+                    for m in self._installed_cache
+                )
+                self._installed_lookup[model] = found
+            return found
 
     def route(
         self,
@@ -235,7 +266,7 @@ class ModelRouter:
             self._warm_model = model
 
 
-@dataclass
+@dataclass(slots=True)
 class RouteResult:
     """Risultato del routing — modello selezionato + metadata."""
     model: str
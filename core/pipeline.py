@@ -1,7 +1,7 @@
 """
 Pipeline Engine — orchestratore di workflow leggero per Omni Eye AI
 
-Zero dipendenze esterne. Usa solo stdlib (threading, concurrent.futures).
+Zero dipendenze esterne. Usa solo stdlib (threading, concurrent.futures, asyncio).
 
 Concetti:
   • Step     — singola unità di lavoro (funzione con retry e timeout)
@@ -16,13 +16,24 @@ Esempio:
     result = pipe.run(filepath="/path/to/doc.pdf")
 """
 
+import asyncio
+import functools
+import hashlib
+import heapq
+import inspect
 import logging
+import os
+import random
 import threading
 import time
-from concurrent.futures import ThreadPoolExecutor, Future
-from dataclasses import dataclass, field
+from collections import OrderedDict
+from concurrent.futures import (
+    FIRST_COMPLETED, Executor, Future, ProcessPoolExecutor, ThreadPoolExecutor,
+    wait,
+)
+from dataclasses import dataclass, field, replace
 from enum import Enum
-from typing import Any, Callable, Dict, List, Optional
+from typing import Any, Callable, Dict, Hashable, Iterable, List, Optional, Tuple
 
 logger = logging.getLogger(__name__)
 
@@ -39,41 +50,87 @@ class StepStatus(Enum):
 
 # ─── Step ───────────────────────────────────────────────────────────────
 
-@dataclass
+@dataclass(slots=True)
 class StepResult:
     """Risultato di un singolo step."""
     status: StepStatus
     output: Any = None
     error: Optional[str] = None
-    duration_ms: float = 0.0
+    duration_ms: int = 0
     retries_used: int = 0
 
 
-@dataclass
+@dataclass(slots=True)
 class Step:
     """Singola unità di lavoro in una pipeline.
 
     Args:
         name:        Identificatore univoco dello step
-        fn:          Funzione da eseguire. Riceve **kwargs (context della pipeline)
-                     e restituisce un valore (disponibile come ctx[name])
+        fn:          Funzione da eseguire. Riceve **kwargs: il contesto iniziale
+                     di run() più l'output di ogni step da cui dipende, anche
+                     indirettamente (kwargs[nome_step]). Restituisce un valore
         depends_on:  Lista di nomi di step che devono completarsi prima
         retries:     Numero di tentativi in caso di errore (0 = nessun retry)
-        backoff:     Secondi di attesa tra i retry (moltiplicati per tentativo)
+        backoff:     Secondi di attesa prima del primo retry (raddoppiati a
+                     ogni tentativo successivo)
+        max_backoff: Tetto in secondi per l'attesa tra i retry
+        jitter:      Randomizzazione dell'attesa, per evitare retry sincronizzati:
+                     "full" → uniforme in [0, d]; "equal" → d/2 + uniforme in
+                     [0, d/2]; "none" → esattamente d
         timeout:     Timeout in secondi per lo step (None = nessun timeout)
         on_error:    "fail" → interrompe la pipeline; "skip" → segna come SKIPPED
+        pure:        True se fn è deterministica e senza side effect: l'output
+                     viene memoizzato per input identici tra un run() e l'altro
+        cache_key_fn: Chiave di cache custom per step pure. Riceve gli stessi
+                     **kwargs di fn; default = hash di repr(kwargs ordinati)
+        executor:    Dove eseguire fn: "thread" (default, adatto a I/O),
+                     "process" (CPU-bound, aggira il GIL: fn e kwargs devono
+                     essere picklable, quindi niente lambda/closure) oppure
+                     "inline" (sul thread che esegue run())
+        inputs:      Segnali astratti da cui dipende lo step (es. "conversations").
+                     run_changed() lo riesegue solo se uno di questi è cambiato;
+                     vuoto = dipendenza ignota, lo step è sempre rieseguito
     """
     name: str
     fn: Callable[..., Any]
     depends_on: List[str] = field(default_factory=list)
     retries: int = 0
     backoff: float = 1.0
+    max_backoff: float = 30.0
+    jitter: str = "full"  # "full" | "equal" | "none"
     timeout: Optional[float] = None
     on_error: str = "fail"  # "fail" | "skip"
+    pure: bool = False
+    cache_key_fn: Optional[Callable[..., Hashable]] = None
+    executor: str = "thread"  # "thread" | "process" | "inline"
+    inputs: List[str] = field(default_factory=list)
 
 
 # ─── Pipeline ──────────────────────────────────────────────────────────
 
+_JITTER_MODES = ("full", "equal", "none")
+_EXECUTOR_KINDS = ("thread", "process", "inline")
+# Segnaposto per "nessun output" negli array per-step di run()
+_MISSING = object()
+# Attesa massima (s) sugli step in corso prima di ricontrollare cancel()
+_CANCEL_POLL_S = 0.1
+
+
+def _timed_call(fn: Callable[..., Any], kwargs: Dict[str, Any]) -> Tuple[bool, Any, int]:
+    """Esegue un singolo tentativo: (ok, output o eccezione, durata ns).
+
+    Funzione di modulo (non metodo) così è picklable per ProcessPoolExecutor.
+    Retry e backoff sono gestiti dal loop di Pipeline.run(): un worker non
+    resta mai bloccato in attesa tra un tentativo e l'altro.
+    """
+    t0 = time.perf_counter_ns()
+    try:
+        output = fn(**kwargs)
+    except Exception as e:
+        return False, e, time.perf_counter_ns() - t0
+    return True, output, time.perf_counter_ns() - t0
+
+
 class PipelineError(Exception):
     """Errore durante l'esecuzione di una pipeline."""
 
@@ -90,14 +147,69 @@ class Pipeline:
         result = pipe.run(input_data="hello")
     """
 
-    def __init__(self, name: str, max_workers: int = 4):
+    def __init__(
+        self,
+        name: str,
+        max_workers: int = 4,
+        cache_size: int = 128,
+        slow_step_ms: float = 50.0,
+    ):
         self.name = name
         self.max_workers = max_workers
+        # Soglia oltre la quale un tentativo di uno step "inline" (che tiene
+        # fermo il dispatch) viene segnalato come lento
+        self.slow_step_ms = slow_step_ms
+        # Un Event di annullamento per ogni run() in corso, controllato a
+        # ogni punto di dispatch: gli step non ancora avviati diventano
+        # SKIPPED. Per-run perché la stessa istanza gira da più thread.
+        self._active_runs: set = set()
+        self._active_lock = threading.Lock()
+        # Output memoizzati degli step pure: (step, chiave input) → output.
+        # LRU condivisa tra i run(): lo scheduler riusa la stessa istanza.
+        self.cache_size = cache_size
+        self._result_cache: "OrderedDict[Tuple[str, Hashable], Any]" = OrderedDict()
+        self._cache_lock = threading.Lock()
+        # Pool a processi per step executor="process": costoso da avviare,
+        # quindi creato al primo uso e riusato tra i run() (vedi close()).
+        self._process_pool: Optional[ProcessPoolExecutor] = None
+        self._process_pool_lock = threading.Lock()
+        # Grafo bloccato (vedi freeze()): add_step non è più ammesso
+        self._frozen = False
         self._steps: Dict[str, Step] = {}
         self._order: List[str] = []
+        # Grafo compilato in add_step come array paralleli indicizzati per
+        # posizione di inserimento (già un ordine topologico): run() lavora
+        # su indici interi, senza hash di nomi nel loop di scheduling.
+        # Dipendenze dello step i: _dep_flat[_dep_offsets[i]:_dep_offsets[i + 1]]
+        self._name_to_idx: Dict[str, int] = {}
+        self._step_list: List[Step] = []
+        self._dep_flat: List[int] = []
+        self._dep_offsets: List[int] = [0]
+        # Archi uscenti: indice step → indici degli step che dipendono da lui
+        self._children: List[List[int]] = []
+        # Antenati (dipendenze dirette e transitive) di ogni step, calcolati
+        # una volta in add_step: sono gli unici output passati come kwargs.
+        self._ancestors: List[Tuple[int, ...]] = []
+        # Step con fn coroutine (async def): run_async() li attende
+        # direttamente sull'event loop invece di passarli a un thread.
+        self._is_async: List[bool] = []
+        # Dati di dispatch memoizzati, per indice: priorità
+        # (-lunghezza cammino critico, indice) e numero di dipendenze.
+        # Invalidati da add_step, ricalcolati da _compile() al primo run().
+        self._compiled = False
+        self._priority: List[Tuple[int, int]] = []
+        self._indegree: List[int] = []
+        # Risultati dell'ultimo run completato, riusati da run_changed()
+        self._last_results: Optional[Dict[str, StepResult]] = None
+        self._last_lock = threading.Lock()
 
     def add_step(self, step: Step) -> "Pipeline":
         """Aggiunge uno step alla pipeline. Restituisce self per chaining."""
+        if self._frozen:
+            raise RuntimeError(
+                f"Pipeline '{self.name}' è condivisa e bloccata: usa copy() "
+                f"per aggiungere step"
+            )
         if step.name in self._steps:
             raise ValueError(f"Step '{step.name}' già presente nella pipeline '{self.name}'")
         for dep in step.depends_on:
@@ -106,165 +218,617 @@ class Pipeline:
                     f"Step '{step.name}' dipende da '{dep}' che non esiste. "
                     f"Aggiungi '{dep}' prima."
                 )
+        if step.executor not in _EXECUTOR_KINDS:
+            raise ValueError(
+                f"Step '{step.name}': executor '{step.executor}' non valido "
+                f"(usa uno tra {', '.join(_EXECUTOR_KINDS)})"
+            )
+        if step.jitter not in _JITTER_MODES:
+            raise ValueError(
+                f"Step '{step.name}': jitter '{step.jitter}' non valido "
+                f"(usa uno tra {', '.join(_JITTER_MODES)})"
+            )
+        idx = len(self._step_list)
+        dep_idx = [self._name_to_idx[dep] for dep in step.depends_on]
         self._steps[step.name] = step
         self._order.append(step.name)
+        self._name_to_idx[step.name] = idx
+        self._step_list.append(step)
+        self._dep_flat.extend(dep_idx)
+        self._dep_offsets.append(len(self._dep_flat))
+        self._children.append([])
+        self._is_async.append(inspect.iscoroutinefunction(step.fn))
+        ancestors: Dict[int, None] = {}
+        for d in dep_idx:
+            self._children[d].append(idx)
+            ancestors.update(dict.fromkeys(self._ancestors[d]))
+            ancestors[d] = None
+        self._ancestors.append(tuple(ancestors))
+        self._compiled = False
         return self
 
-    def run(self, **kwargs: Any) -> Dict[str, StepResult]:
+    def copy(self) -> "Pipeline":
+        """Copia indipendente (stessi step, cache e pool vuoti).
+
+        I builder restituiscono istanze condivise e memoizzate: chi deve
+        aggiungere step lavora su una copia.
+        """
+        clone = Pipeline(self.name, max_workers=self.max_workers,
+                         cache_size=self.cache_size, slow_step_ms=self.slow_step_ms)
+        for name in self._order:
+            step = self._steps[name]
+            clone.add_step(replace(step, depends_on=list(step.depends_on)))
+        return clone
+
+    def freeze(self) -> "Pipeline":
+        """Blocca il grafo: add_step solleva RuntimeError. Restituisce self.
+
+        Usato dai builder, le cui istanze sono condivise da tutto il
+        processo (scheduler, app): le modifiche vanno fatte su copy(),
+        che restituisce sempre una pipeline non bloccata.
+        """
+        self._frozen = True
+        return self
+
+    def cancel(self) -> None:
+        """Annulla tutti i run() in corso su questa istanza.
+
+        Nessun nuovo step viene avviato. Gli step già in esecuzione in un
+        pool non vengono interrotti, ma run() ritorna entro ~_CANCEL_POLL_S
+        senza attenderli (gli step "inline" girano sul thread di run() e
+        vanno lasciati finire). I run avviati dopo non sono toccati.
+        Per annullare un solo run tra più run concorrenti, passargli un
+        cancel_event e impostare quello.
+        """
+        with self._active_lock:
+            events = list(self._active_runs)
+        for event in events:
+            event.set()
+
+    def _begin_run(self, cancel_event: Optional[threading.Event]) -> threading.Event:
+        """Registra un run in corso; restituisce il suo Event di annullamento."""
+        event = cancel_event if cancel_event is not None else threading.Event()
+        with self._active_lock:
+            self._active_runs.add(event)
+        return event
+
+    def _end_run(self, event: threading.Event) -> None:
+        with self._active_lock:
+            self._active_runs.discard(event)
+
+    def _compile(self) -> None:
+        """Calcola (una sola volta) priorità e numero di dipendenze per step.
+
+        add_step garantisce che le dipendenze esistano già, quindi _order è
+        un ordinamento topologico valido: percorrendolo a ritroso, la
+        lunghezza del cammino critico di uno step è 1 + il massimo tra i
+        figli. O(V+E), una volta sola. run() avvia per primi gli step pronti
+        con il cammino più lungo, così la catena che determina la durata
+        totale non resta in coda dietro step brevi.
+        """
+        if self._compiled:
+            return
+        n = len(self._step_list)
+        off = self._dep_offsets
+        critical = [0] * n
+        for i in range(n - 1, -1, -1):
+            critical[i] = 1 + max(
+                (critical[c] for c in self._children[i]), default=0,
+            )
+        self._priority = [(-critical[i], i) for i in range(n)]
+        self._indegree = [off[i + 1] - off[i] for i in range(n)]
+        self._compiled = True
+
+    def run(
+        self,
+        executor: Optional[Executor] = None,
+        cancel_event: Optional[threading.Event] = None,
+        **kwargs: Any,
+    ) -> Dict[str, StepResult]:
         """Esegue la pipeline.
 
+        Rientrante: tutto lo stato di esecuzione (annullamento compreso) è
+        locale alla chiamata, quindi la stessa istanza può girare da più
+        thread insieme.
+
         Args:
-            **kwargs: Contesto iniziale passato a tutti gli step
+            executor:     Executor condiviso per gli step executor="thread"
+                          (es. quello di PipelineScheduler). Non viene chiuso
+                          da run() e il suo numero di worker prende il posto
+                          di max_workers. None = pool locale creato se serve
+            cancel_event: Event che annulla solo questo run quando viene
+                          impostato (come cancel(), che invece li annulla
+                          tutti). None = ne viene creato uno interno
+            **kwargs:     Contesto iniziale passato a tutti gli step
 
         Returns:
             Dict con il nome dello step come chiave e StepResult come valore
         """
-        t_start = time.perf_counter()
-        ctx: Dict[str, Any] = dict(kwargs)
-        results: Dict[str, StepResult] = {}
-        completed: Dict[str, threading.Event] = {
-            name: threading.Event() for name in self._steps
-        }
-
-        logger.info("Pipeline '%s': avvio (%d step)", self.name, len(self._steps))
+        return self._run(kwargs, executor, None, cancel_event)
 
-        with ThreadPoolExecutor(max_workers=self.max_workers) as pool:
-            futures: Dict[str, Future] = {}
+    def run_changed(
+        self,
+        signals: Iterable[str],
+        executor: Optional[Executor] = None,
+        cancel_event: Optional[threading.Event] = None,
+        **kwargs: Any,
+    ) -> Dict[str, StepResult]:
+        """Riesegue solo la parte di pipeline toccata dai segnali cambiati.
+
+        Sono "sporchi" gli step con un input in signals, quelli senza
+        inputs dichiarati, quelli non riusciti all'ultimo run e tutti i loro
+        successori. Gli altri riusano l'ultimo risultato (SUCCESS, 0 ms).
+        Senza un run precedente esegue tutta la pipeline.
 
-            def _submit(step: Step) -> None:
-                """Sottomette uno step per l'esecuzione."""
-                fut = pool.submit(self._run_step, step, ctx, results, completed)
-                futures[step.name] = fut
+        Args:
+            signals:      Nomi dei segnali cambiati dall'ultimo run
+            executor:     Come in run()
+            cancel_event: Come in run()
+            **kwargs:     Contesto iniziale passato agli step rieseguiti
+        """
+        with self._last_lock:
+            last = self._last_results
+        self._compile()
+        steps, children = self._step_list, self._children
+        if last is None or len(last) != len(steps):
+            return self._run(kwargs, executor, None, cancel_event)
+        changed = set(signals)
+        dirty = [
+            not step.inputs
+            or not changed.isdisjoint(step.inputs)
+            or last[step.name].status != StepStatus.SUCCESS
+            for step in steps
+        ]
+        # Propaga ai successori: l'ordine di inserimento è topologico
+        for i in range(len(steps)):
+            if dirty[i]:
+                for child in children[i]:
+                    dirty[child] = True
+        reuse = {
+            i: StepResult(status=StepStatus.SUCCESS, output=last[step.name].output)
+            for i, step in enumerate(steps) if not dirty[i]
+        }
+        logger.info("Pipeline '%s': %d/%d step da rieseguire",
+                    self.name, len(steps) - len(reuse), len(steps))
+        return self._run(kwargs, executor, reuse, cancel_event)
 
-            # Topological execution: lancia step senza dipendenze subito,
-            # gli altri appena le loro dipendenze sono soddisfatte.
-            pending = list(self._order)
+    def _run(
+        self,
+        kwargs: Dict[str, Any],
+        executor: Optional[Executor],
+        reuse: Optional[Dict[int, StepResult]],
+        cancel_event: Optional[threading.Event] = None,
+    ) -> Dict[str, StepResult]:
+        """Corpo di run(): reuse = risultati già noti per indice di step."""
+        t_start = time.perf_counter_ns()
+        # Livello di log letto una volta per run(): i log per-step a DEBUG
+        # non costruiscono argomenti se il livello li filtra.
+        debug = logger.isEnabledFor(logging.DEBUG)
+        cancelled = False
+        self._compile()
+        # Tutto per indice di step (vedi add_step)
+        steps, names = self._step_list, self._order
+        flat, off = self._dep_flat, self._dep_offsets
+        children, ancestors, priority = self._children, self._ancestors, self._priority
+        n = len(steps)
+        outputs: List[Any] = [_MISSING] * n
+        failed = [False] * n
+        # Risultati per indice di step; il dict per nome è costruito una
+        # sola volta a fine esecuzione.
+        results: List[Optional[StepResult]] = [None] * n
+
+        logger.info("Pipeline '%s': avvio (%d step)", self.name, n)
+
+        # Scheduling a coda di pronti: appena uno step termina, i figli con
+        # tutte le dipendenze risolte partono subito (nessuna barriera per
+        # livello che aspetti lo step più lento). I pronti sono un heap di
+        # priorità (-cammino critico, indice): il secondo campo è lo step.
+        remaining = list(self._indegree)
+        ready: List[Tuple[int, int]] = [priority[i] for i in range(n) if not remaining[i]]
+        heapq.heapify(ready)
+        in_flight: Dict[Future, Tuple[int, int]] = {}
+        # Retry in attesa: (deadline monotonic, step, tentativo).
+        # Il backoff non occupa un worker: lo step viene ri-sottomesso
+        # quando la deadline scade.
+        retry_heap: List[Tuple[float, int, int]] = []
+        call_kwargs: List[Optional[Dict[str, Any]]] = [None] * n
+        cache_keys: Dict[int, Tuple[str, Hashable]] = {}
+        # Tempo speso per step in ns (interi): convertito in ms una volta sola
+        spent_ns = [0] * n
+        slow_ns = int(self.slow_step_ms * 1_000_000)
+        # Senza executor condiviso il pool locale viene creato solo se
+        # servono ≥2 step in contemporanea: le pipeline puramente
+        # sequenziali non avviano nessun thread.
+        pool: Optional[Executor] = executor
+
+        def _resolve(i: int, result: StepResult) -> None:
+            results[i] = result
+            if result.status == StepStatus.SUCCESS:
+                outputs[i] = result.output
+            elif result.status == StepStatus.FAILED:
+                failed[i] = True
+            for child in children[i]:
+                remaining[child] -= 1
+                if remaining[child] == 0:
+                    heapq.heappush(ready, priority[child])
+
+        def _dispatch(i: int, attempt: int) -> None:
+            nonlocal pool
+            step = steps[i]
+            if step.executor == "process":
+                fut = self._get_process_pool().submit(_timed_call, step.fn, call_kwargs[i])
+            elif step.executor == "inline" or (
+                not ready and not in_flight and not retry_heap
+            ):
+                # Inline richiesto, o fast-path (unico step eseguibile):
+                # esegue sul thread corrente senza passare da un pool.
+                # Solo l'inline esplicito può tenere fermi altri step: il
+                # fast-path per definizione non ha nulla in parallelo.
+                _complete(i, attempt, _timed_call(step.fn, call_kwargs[i]),
+                          blocking=step.executor == "inline")
+                return
+            else:
+                if pool is None:
+                    pool = ThreadPoolExecutor(max_workers=self.max_workers)
+                fut = pool.submit(_timed_call, step.fn, call_kwargs[i])
+            in_flight[fut] = (i, attempt)
+
+        def _complete(i: int, attempt: int, outcome: Tuple[bool, Any, int],
+                      blocking: bool = False) -> None:
+            ok, value, elapsed_ns = outcome
+            step = steps[i]
+            spent_ns[i] += elapsed_ns
+            # Solo gli step "inline" bloccano il dispatch: quelli nei pool
+            # girano in parallelo agli altri
+            if blocking and elapsed_ns > slow_ns:
+                logger.warning("Step '%s': ha bloccato la pipeline per %d ms",
+                               step.name, elapsed_ns // 1_000_000)
+            if ok:
+                if debug:
+                    logger.debug("Step '%s': OK in %dms (retry: %d)",
+                                 step.name, spent_ns[i] // 1_000_000, attempt)
+                if i in cache_keys:
+                    self._cache_store(cache_keys[i], value)
+                _resolve(i, StepResult(
+                    status=StepStatus.SUCCESS,
+                    output=value,
+                    duration_ms=spent_ns[i] // 1_000_000,
+                    retries_used=attempt,
+                ))
+                return
+            logger.warning("Step '%s': errore (tentativo %d/%d): %s",
+                           step.name, attempt + 1, step.retries + 1, value)
+            if attempt < step.retries:
+                delay = self._retry_delay(step, attempt)
+                if debug:
+                    logger.debug("Step '%s': retry %d/%d (attesa %.2fs)",
+                                 step.name, attempt + 1, step.retries, delay)
+                heapq.heappush(retry_heap, (time.monotonic() + delay, i, attempt + 1))
+                return
+            # Tutti i tentativi falliti
+            _resolve(i, StepResult(
+                status=StepStatus.SKIPPED if step.on_error == "skip" else StepStatus.FAILED,
+                error=str(value),
+                duration_ms=spent_ns[i] // 1_000_000,
+                retries_used=step.retries,
+            ))
 
-            def _launch_ready() -> int:
-                """Lancia gli step le cui dipendenze sono tutte soddisfatte."""
-                launched = 0
-                still_pending = []
-                for name in pending:
-                    if name in futures:
+        cancel = self._begin_run(cancel_event)
+        try:
+            while ready or in_flight or retry_heap:
+                if cancel.is_set():
+                    cancelled = True
+                    break
+                now = time.monotonic()
+                while retry_heap and retry_heap[0][0] <= now:
+                    _, i, attempt = heapq.heappop(retry_heap)
+                    _dispatch(i, attempt)
+
+                while ready and not cancel.is_set():
+                    i = heapq.heappop(ready)[1]
+                    if reuse and i in reuse:
+                        _resolve(i, reuse[i])
                         continue
-                    step = self._steps[name]
-                    deps_met = all(completed[d].is_set() for d in step.depends_on)
-                    if deps_met:
-                        # Controlla se qualche dipendenza è fallita (e on_error=fail)
-                        dep_failed = any(
-                            results.get(d) and results[d].status == StepStatus.FAILED
-                            for d in step.depends_on
-                        )
-                        if dep_failed and step.on_error != "skip":
-                            results[name] = StepResult(
-                                status=StepStatus.SKIPPED,
-                                error="Dipendenza fallita",
-                            )
-                            completed[name].set()
-                        else:
-                            _submit(step)
-                            launched += 1
-                    else:
-                        still_pending.append(name)
-                pending.clear()
-                pending.extend(still_pending)
-                return launched
-
-            # Prima passata: lancia step senza dipendenze
-            _launch_ready()
-
-            # Attendi il completamento e lancia nuovi step man mano
-            while len(results) < len(self._steps):
-                # Attendi che almeno uno step si completi
-                for name, evt in completed.items():
-                    if name not in results:
+                    step = steps[i]
+                    # Dipendenza fallita (e on_error=fail) → step saltato
+                    dep_failed = any(failed[d] for d in flat[off[i]:off[i + 1]])
+                    if dep_failed and step.on_error != "skip":
+                        _resolve(i, StepResult(
+                            status=StepStatus.SKIPPED,
+                            error="Dipendenza fallita",
+                        ))
                         continue
-                    # Già completato, skip
-                if not pending and all(n in results for n in self._steps):
-                    break
-                # Polling leggero — controlla nuovi step pronti
-                time.sleep(0.01)
-                _launch_ready()
-                # Controlla completamento futures
-                for name, fut in list(futures.items()):
-                    if fut.done() and name not in results:
+                    # kwargs costruiti qui (thread principale): contesto
+                    # iniziale + output dei soli antenati già completati.
+                    call_kwargs[i] = {
+                        **kwargs,
+                        **{names[a]: outputs[a] for a in ancestors[i]
+                           if outputs[a] is not _MISSING},
+                    }
+                    if step.pure:
+                        key = (step.name, self._cache_key(step, call_kwargs[i]))
+                        hit, output = self._cache_lookup(key)
+                        if hit:
+                            if debug:
+                                logger.debug("Step '%s': cache hit", step.name)
+                            _resolve(i, StepResult(
+                                status=StepStatus.SUCCESS, output=output,
+                            ))
+                            continue
+                        cache_keys[i] = key
+                    _dispatch(i, 0)
+
+                next_retry = (
+                    max(0.0, retry_heap[0][0] - time.monotonic())
+                    if retry_heap else None
+                )
+                if in_flight:
+                    # Attesa limitata: un cancel() viene notato anche se
+                    # nessuno step in corso termina
+                    timeout = (_CANCEL_POLL_S if next_retry is None
+                               else min(next_retry, _CANCEL_POLL_S))
+                    done, _ = wait(in_flight, timeout=timeout,
+                                   return_when=FIRST_COMPLETED)
+                    for fut in done:
+                        i, attempt = in_flight.pop(fut)
                         try:
-                            fut.result(timeout=0)
-                        except Exception:
-                            pass  # Errore già gestito in _run_step
+                            outcome = fut.result()
+                        except Exception as e:
+                            # Es. kwargs non picklable per executor="process"
+                            outcome = (False, e, 0)
+                        _complete(i, attempt, outcome)
+                elif next_retry and not ready:
+                    # Nient'altro da fare finché il prossimo retry non scade
+                    # (o finché la pipeline non viene annullata)
+                    cancel.wait(next_retry)
+        finally:
+            self._end_run(cancel)
+            if cancelled:
+                # Non attende gli step ancora in esecuzione
+                for fut in in_flight:
+                    fut.cancel()
+            if pool is not None and pool is not executor:
+                pool.shutdown(wait=not cancelled)
+
+        if cancelled:
+            logger.warning("Pipeline '%s': annullata", self.name)
+            for i in range(n):
+                if results[i] is None:
+                    results[i] = StepResult(
+                        status=StepStatus.SKIPPED, error="Pipeline annullata",
+                    )
+
+        by_name = dict(zip(names, results))
+        self._log_summary(t_start, by_name)
+        with self._last_lock:
+            self._last_results = by_name
+        return by_name
+
+    async def run_async(
+        self, cancel_event: Optional[threading.Event] = None, **kwargs: Any,
+    ) -> Dict[str, StepResult]:
+        """Variante asyncio di run(), per pipeline I/O-bound.
+
+        Le fn coroutine (async def) vengono attese sull'event loop; le fn
+        sincrone girano in asyncio.to_thread (executor="thread"), nel pool a
+        processi (executor="process") o direttamente sul loop ("inline").
+        Al massimo max_workers step alla volta (asyncio.Semaphore).
+        Dipendenze, on_error, retry con backoff, cache degli step pure e
+        cancel() si comportano come in run(); in più, per gli step async,
+        Step.timeout viene applicato con asyncio.wait_for.
+
+        Args:
+            cancel_event: Come in run()
+            **kwargs:     Contesto iniziale passato a tutti gli step
+
+        Returns:
+            Dict con il nome dello step come chiave e StepResult come valore
+        """
+        t_start = time.perf_counter_ns()
+        self._compile()
+        steps, names = self._step_list, self._order
+        flat, off = self._dep_flat, self._dep_offsets
+        children, ancestors, priority = self._children, self._ancestors, self._priority
+        n = len(steps)
+        outputs: List[Any] = [_MISSING] * n
+        failed = [False] * n
+        # Risultati per indice di step; il dict per nome è costruito una
+        # sola volta a fine esecuzione.
+        results: List[Optional[StepResult]] = [None] * n
+        sem = asyncio.Semaphore(self.max_workers)
+        slow_ns = int(self.slow_step_ms * 1_000_000)
+
+        logger.info("Pipeline '%s': avvio async (%d step)", self.name, n)
+
+        async def _call(i: int, call_kw: Dict[str, Any]) -> Any:
+            step = steps[i]
+            if self._is_async[i]:
+                return await asyncio.wait_for(step.fn(**call_kw), step.timeout)
+            if step.executor == "process":
+                return await asyncio.wrap_future(
+                    self._get_process_pool().submit(step.fn, **call_kw)
+                )
+            if step.executor == "inline":
+                return step.fn(**call_kw)
+            return await asyncio.to_thread(step.fn, **call_kw)
+
+        async def _execute(i: int, call_kw: Dict[str, Any]) -> StepResult:
+            step = steps[i]
+            blocks_loop = step.executor == "inline" and not self._is_async[i]
+            spent_ns = 0
+            for attempt in range(step.retries + 1):
+                # Lo slot del semaforo è occupato solo durante il tentativo,
+                # non durante l'attesa di backoff.
+                async with sem:
+                    t0 = time.perf_counter_ns()
+                    try:
+                        output = await _call(i, call_kw)
+                        error = None
+                    except Exception as e:
+                        error = e
+                    elapsed_ns = time.perf_counter_ns() - t0
+                spent_ns += elapsed_ns
+                # Solo gli step sincroni "inline" girano sull'event loop
+                # e bloccano gli altri
+                if blocks_loop and elapsed_ns > slow_ns:
+                    logger.warning("Step '%s': ha bloccato la pipeline per %d ms",
+                                   step.name, elapsed_ns // 1_000_000)
+                if error is None:
+                    return StepResult(
+                        status=StepStatus.SUCCESS, output=output,
+                        duration_ms=spent_ns // 1_000_000, retries_used=attempt,
+                    )
+                logger.warning("Step '%s': errore (tentativo %d/%d): %s",
+                               step.name, attempt + 1, step.retries + 1, error)
+                if attempt < step.retries:
+                    await asyncio.sleep(self._retry_delay(step, attempt))
+            return StepResult(
+                status=StepStatus.SKIPPED if step.on_error == "skip" else StepStatus.FAILED,
+                error=str(error),
+                duration_ms=spent_ns // 1_000_000,
+                retries_used=step.retries,
+            )
 
-        elapsed = (time.perf_counter() - t_start) * 1000
+        remaining = list(self._indegree)
+        ready: List[Tuple[int, int]] = [priority[i] for i in range(n) if not remaining[i]]
+        heapq.heapify(ready)
+        in_flight: Dict["asyncio.Task[StepResult]", int] = {}
+        cache_keys: Dict[int, Tuple[str, Hashable]] = {}
+
+        def _resolve(i: int, result: StepResult) -> None:
+            results[i] = result
+            if result.status == StepStatus.SUCCESS:
+                outputs[i] = result.output
+            elif result.status == StepStatus.FAILED:
+                failed[i] = True
+            for child in children[i]:
+                remaining[child] -= 1
+                if remaining[child] == 0:
+                    heapq.heappush(ready, priority[child])
+
+        cancelled = False
+        cancel = self._begin_run(cancel_event)
+        try:
+            while ready or in_flight:
+                if cancel.is_set():
+                    cancelled = True
+                    break
+                while ready:
+                    i = heapq.heappop(ready)[1]
+                    step = steps[i]
+                    dep_failed = any(failed[d] for d in flat[off[i]:off[i + 1]])
+                    if dep_failed and step.on_error != "skip":
+                        _resolve(i, StepResult(
+                            status=StepStatus.SKIPPED,
+                            error="Dipendenza fallita",
+                        ))
+                        continue
+                    call_kw = {
+                        **kwargs,
+                        **{names[a]: outputs[a] for a in ancestors[i]
+                           if outputs[a] is not _MISSING},
+                    }
+                    if step.pure:
+                        key = (step.name, self._cache_key(step, call_kw))
+                        hit, output = self._cache_lookup(key)
+                        if hit:
+                            _resolve(i, StepResult(
+                                status=StepStatus.SUCCESS, output=output,
+                            ))
+                            continue
+                        cache_keys[i] = key
+                    in_flight[asyncio.ensure_future(_execute(i, call_kw))] = i
+                if not in_flight:
+                    continue
+                # Attesa limitata: un cancel() viene notato anche se
+                # nessuno step in corso termina
+                done, _ = await asyncio.wait(
+                    in_flight, timeout=_CANCEL_POLL_S,
+                    return_when=asyncio.FIRST_COMPLETED,
+                )
+                for task in done:
+                    i = in_flight.pop(task)
+                    result = task.result()
+                    if result.status == StepStatus.SUCCESS and i in cache_keys:
+                        self._cache_store(cache_keys[i], result.output)
+                    _resolve(i, result)
+        finally:
+            self._end_run(cancel)
+            for task in in_flight:
+                task.cancel()
+
+        if cancelled:
+            logger.warning("Pipeline '%s': annullata", self.name)
+            for i in range(n):
+                if results[i] is None:
+                    results[i] = StepResult(
+                        status=StepStatus.SKIPPED, error="Pipeline annullata",
+                    )
+
+        by_name = dict(zip(names, results))
+        self._log_summary(t_start, by_name)
+        with self._last_lock:
+            self._last_results = by_name
+        return by_name
+
+    def _log_summary(self, t_start: int, results: Dict[str, StepResult]) -> None:
+        """Log di fine esecuzione (t_start: perf_counter_ns all'avvio)."""
+        elapsed_ms = (time.perf_counter_ns() - t_start) // 1_000_000
         ok = sum(1 for r in results.values() if r.status == StepStatus.SUCCESS)
         fail = sum(1 for r in results.values() if r.status == StepStatus.FAILED)
         logger.info(
-            "Pipeline '%s': completata in %.0fms (%d ok, %d fail, %d skip)",
-            self.name, elapsed, ok, fail,
+            "Pipeline '%s': completata in %dms (%d ok, %d fail, %d skip)",
+            self.name, elapsed_ms, ok, fail,
             len(results) - ok - fail,
         )
-        return results
-
-    def _run_step(
-        self,
-        step: Step,
-        ctx: Dict[str, Any],
-        results: Dict[str, StepResult],
-        completed: Dict[str, threading.Event],
-    ) -> None:
-        """Esegue un singolo step con retry e timeout."""
-        # Attendi le dipendenze
-        for dep in step.depends_on:
-            completed[dep].wait()
-
-        t0 = time.perf_counter()
-        last_error = None
-
-        for attempt in range(step.retries + 1):
-            try:
-                if attempt > 0:
-                    wait = step.backoff * attempt
-                    logger.debug("Step '%s': retry %d/%d (attesa %.1fs)",
-                                 step.name, attempt, step.retries, wait)
-                    time.sleep(wait)
-
-                output = step.fn(**ctx)
-
-                # Salva l'output nel contesto (disponibile per step successivi)
-                ctx[step.name] = output
 
-                elapsed = (time.perf_counter() - t0) * 1000
-                results[step.name] = StepResult(
-                    status=StepStatus.SUCCESS,
-                    output=output,
-                    duration_ms=elapsed,
-                    retries_used=attempt,
-                )
-                completed[step.name].set()
-                logger.debug("Step '%s': OK in %.0fms (retry: %d)",
-                             step.name, elapsed, attempt)
-                return
-
-            except Exception as e:
-                last_error = str(e)
-                logger.warning("Step '%s': errore (tentativo %d/%d): %s",
-                               step.name, attempt + 1, step.retries + 1, e)
-
-        # Tutti i tentativi falliti
-        elapsed = (time.perf_counter() - t0) * 1000
-        if step.on_error == "skip":
-            results[step.name] = StepResult(
-                status=StepStatus.SKIPPED,
-                error=last_error,
-                duration_ms=elapsed,
-                retries_used=step.retries,
-            )
-        else:
-            results[step.name] = StepResult(
-                status=StepStatus.FAILED,
-                error=last_error,
-                duration_ms=elapsed,
-                retries_used=step.retries,
-            )
-        completed[step.name].set()
+    @staticmethod
+    def _cache_key(step: Step, kwargs: Dict[str, Any]) -> Hashable:
+        """Chiave di memoizzazione per gli input di uno step pure."""
+        if step.cache_key_fn is not None:
+            return step.cache_key_fn(**kwargs)
+        return hashlib.blake2b(
+            repr(sorted(kwargs.items())).encode("utf-8"), digest_size=16,
+        ).digest()
+
+    def _cache_lookup(self, key: Tuple[str, Hashable]) -> Tuple[bool, Any]:
+        """Cerca l'output memoizzato di uno step pure: (trovato, output)."""
+        with self._cache_lock:
+            if key in self._result_cache:
+                self._result_cache.move_to_end(key)
+                return True, self._result_cache[key]
+        return False, None
+
+    def _cache_store(self, key: Tuple[str, Hashable], output: Any) -> None:
+        """Memoizza l'output di uno step pure (LRU, max cache_size voci)."""
+        with self._cache_lock:
+            self._result_cache[key] = output
+            if len(self._result_cache) > self.cache_size:
+                self._result_cache.popitem(last=False)
+
+    @staticmethod
+    def _retry_delay(step: Step, attempt: int) -> float:
+        """Attesa prima del retry: backoff esponenziale con tetto e jitter."""
+        delay = min(step.backoff * (2 ** attempt), step.max_backoff)
+        if step.jitter == "full":
+            return random.uniform(0, delay)
+        if step.jitter == "equal":
+            return delay / 2 + random.uniform(0, delay / 2)
+        return delay
+
+    def _get_process_pool(self) -> ProcessPoolExecutor:
+        """ProcessPoolExecutor condiviso tra i run(), creato al primo uso."""
+        with self._process_pool_lock:
+            if self._process_pool is None:
+                self._process_pool = ProcessPoolExecutor(max_workers=self.max_workers)
+            return self._process_pool
+
+    def close(self) -> None:
+        """Termina il pool a processi (se creato). La pipeline resta usabile."""
+        with self._process_pool_lock:
+            if self._process_pool is not None:
+                self._process_pool.shutdown(wait=True)
+                self._process_pool = None
 
 
 # ─── Scheduler ─────────────────────────────────────────────────────────
@@ -272,7 +836,10 @@ class Pipeline:
 class PipelineScheduler:
     """Scheduler leggero per eseguire pipeline periodicamente.
 
-    Usa un singolo daemon thread. Nessuna dipendenza esterna.
+    Un daemon thread attende le scadenze; ogni esecuzione gira in un thread
+    dedicato, limitato dal pool di risorse del task (stile Airflow: es.
+    pool "disk" con 1 slot → mai due pipeline I/O-heavy insieme).
+    Nessuna dipendenza esterna.
 
     Esempio:
         scheduler = PipelineScheduler()
@@ -282,11 +849,23 @@ class PipelineScheduler:
         scheduler.stop()
     """
 
+    DEFAULT_POOL_SLOTS = 4
+
     def __init__(self):
         self._tasks: Dict[str, Dict] = {}
+        # Prossime esecuzioni: min-heap di (deadline monotonic, nome task).
+        # Il thread dorme esattamente fino alla deadline più vicina.
+        self._heap: List[Tuple[float, str]] = []
         self._thread: Optional[threading.Thread] = None
         self._stop_event = threading.Event()
+        # Risveglia il loop quando cambia l'heap (register) o su stop()
+        self._wakeup = threading.Event()
         self._lock = threading.Lock()
+        # Pool di risorse: nome → semaforo con N slot di concorrenza
+        self._pools: Dict[str, threading.Semaphore] = {}
+        # Thread pool condiviso dagli step di tutte le pipeline: creato in
+        # start(), evita di avviare nuovi thread a ogni esecuzione.
+        self._exec: Optional[ThreadPoolExecutor] = None
 
     def register(
         self,
@@ -295,17 +874,46 @@ class PipelineScheduler:
         interval_seconds: int,
         kwargs: Optional[Dict] = None,
         run_on_start: bool = False,
+        pool: str = "default",
+        slots: Optional[int] = None,
+        signals: Optional[Dict[str, Callable[[], Any]]] = None,
     ) -> None:
-        """Registra una pipeline per l'esecuzione periodica."""
+        """Registra una pipeline per l'esecuzione periodica.
+
+        Args:
+            pool:    Pool di risorse condiviso con altri task (es. "cpu", "disk")
+            slots:   Esecuzioni concorrenti ammesse nel pool. Vale solo alla
+                     prima registrazione del pool (default: DEFAULT_POOL_SLOTS)
+            signals: Nome segnale → funzione che ne legge il valore corrente
+                     (es. mtime di una cartella). Se presenti, a ogni tick
+                     vengono rieseguiti solo gli step con input cambiati
+                     (vedi Pipeline.run_changed)
+        """
+        # Pre-calcola i dati di dispatch: la prima esecuzione schedulata li
+        # trova pronti
+        pipeline._compile()
+        next_run = time.monotonic() + (0 if run_on_start else interval_seconds)
         with self._lock:
+            if pool not in self._pools:
+                self._pools[pool] = threading.Semaphore(slots or self.DEFAULT_POOL_SLOTS)
             self._tasks[name] = {
                 "pipeline": pipeline,
                 "interval": interval_seconds,
                 "kwargs": kwargs or {},
+                "pool": pool,
+                "signals": signals or {},
+                "signal_values": {},
+                "running": False,
+                # Event di annullamento del run in corso (solo di questo
+                # task: la pipeline può girare anche fuori dallo scheduler)
+                "cancel": None,
                 "last_run": 0.0 if run_on_start else time.time(),
+                "next_run": next_run,
                 "run_count": 0,
                 "last_result": None,
             }
+            heapq.heappush(self._heap, (next_run, name))
+        self._wakeup.set()
         logger.info("Scheduler: registrata '%s' (ogni %ds, on_start=%s)",
                      name, interval_seconds, run_on_start)
 
@@ -314,6 +922,9 @@ class PipelineScheduler:
         if self._thread and self._thread.is_alive():
             return
         self._stop_event.clear()
+        self._exec = ThreadPoolExecutor(
+            max_workers=os.cpu_count() or 4, thread_name_prefix="pipeline-step",
+        )
         self._thread = threading.Thread(
             target=self._loop, name="pipeline-scheduler", daemon=True,
         )
@@ -321,10 +932,18 @@ class PipelineScheduler:
         logger.info("Scheduler: avviato")
 
     def stop(self) -> None:
-        """Ferma il thread scheduler."""
+        """Ferma il thread scheduler e annulla le pipeline in esecuzione."""
         self._stop_event.set()
+        self._wakeup.set()
+        with self._lock:
+            events = [t["cancel"] for t in self._tasks.values() if t["cancel"]]
+        for event in events:
+            event.set()
         if self._thread:
             self._thread.join(timeout=5)
+        if self._exec is not None:
+            self._exec.shutdown(wait=False)
+            self._exec = None
         logger.info("Scheduler: fermato")
 
     def get_status(self) -> Dict[str, Dict]:
@@ -333,6 +952,7 @@ class PipelineScheduler:
             return {
                 name: {
                     "interval": t["interval"],
+                    "pool": t["pool"],
                     "run_count": t["run_count"],
                     "last_run": t["last_run"],
                     "last_result": (
@@ -343,35 +963,126 @@ class PipelineScheduler:
                 for name, t in self._tasks.items()
             }
 
+    def _next_due(self) -> Optional[str]:
+        """Estrae dall'heap il task scaduto, se c'è; altrimenti attende.
+
+        Voci obsolete (task ri-registrato con nuova deadline) vengono scartate.
+        """
+        with self._lock:
+            while self._heap:
+                deadline, name = self._heap[0]
+                task = self._tasks.get(name)
+                if task is None or task["next_run"] != deadline:
+                    heapq.heappop(self._heap)
+                    continue
+                delay = deadline - time.monotonic()
+                if delay <= 0:
+                    heapq.heappop(self._heap)
+                    return name
+                break
+            else:
+                delay = None
+        # Nessun task scaduto: dorme fino alla prossima deadline (o a un
+        # register/stop). clear() prima di ricontrollare l'heap al giro dopo.
+        self._wakeup.wait(timeout=delay)
+        self._wakeup.clear()
+        return None
+
     def _loop(self) -> None:
-        """Loop principale dello scheduler."""
+        """Loop principale dello scheduler: avvia i task scaduti."""
         while not self._stop_event.is_set():
-            now = time.time()
+            name = self._next_due()
+            if name is None:
+                continue
             with self._lock:
-                tasks_snapshot = list(self._tasks.items())
-
-            for name, task in tasks_snapshot:
-                if now - task["last_run"] >= task["interval"]:
-                    try:
-                        logger.info("Scheduler: esecuzione '%s'", name)
-                        result = task["pipeline"].run(**task["kwargs"])
-                        with self._lock:
-                            self._tasks[name]["last_run"] = now
-                            self._tasks[name]["run_count"] += 1
-                            self._tasks[name]["last_result"] = result
-                    except Exception as e:
-                        logger.error("Scheduler: errore in '%s': %s", name, e)
-                        with self._lock:
-                            self._tasks[name]["last_run"] = now
+                task = self._tasks[name]
+                if task["running"]:
+                    continue  # verrà rischedulato a fine esecuzione
+                task["running"] = True
+                sem = self._pools[task["pool"]]
+            threading.Thread(
+                target=self._run_task, args=(name, task, sem),
+                name=f"pipeline-{name}", daemon=True,
+            ).start()
+
+    @staticmethod
+    def _changed_signals(name: str, task: Dict) -> Tuple[List[str], Dict[str, Any]]:
+        """Legge i segnali del task e restituisce quelli cambiati dal tick precedente.
 
-            # Sleep breve per non consumare CPU
-            self._stop_event.wait(timeout=10)
+        Returns:
+            (segnali cambiati, valori correnti). I valori vanno salvati in
+            task["signal_values"] solo dopo un run riuscito: se il run
+            fallisce, il tick successivo vede ancora il cambiamento.
+        """
+        previous = task["signal_values"]
+        current: Dict[str, Any] = {}
+        for signal, read in task["signals"].items():
+            try:
+                current[signal] = read()
+            except Exception as e:
+                logger.warning("Scheduler: segnale '%s' di '%s' non leggibile: %s",
+                               signal, name, e)
+                current[signal] = _MISSING  # mai uguale: forza la riesecuzione
+        changed = [
+            signal for signal, value in current.items()
+            if value is _MISSING or previous.get(signal, _MISSING) != value
+        ]
+        return changed, current
+
+    def _run_task(self, name: str, task: Dict, sem: threading.Semaphore) -> None:
+        """Esegue un task occupando uno slot del suo pool, poi lo rischedula."""
+        cancel = threading.Event()
+        # Registrato prima del controllo di stop(): o stop() lo trova e lo
+        # imposta, o il controllo qui sotto vede già lo stop
+        with self._lock:
+            task["cancel"] = cancel
+        try:
+            # Attende uno slot libero, restando reattivo a stop()
+            while not sem.acquire(timeout=0.5):
+                if self._stop_event.is_set():
+                    return
+            if self._stop_event.is_set():
+                sem.release()
+                return
+            try:
+                logger.info("Scheduler: esecuzione '%s' (pool=%s)", name, task["pool"])
+                if task["signals"]:
+                    changed, values = self._changed_signals(name, task)
+                    result = task["pipeline"].run_changed(
+                        changed, executor=self._exec, cancel_event=cancel,
+                        **task["kwargs"],
+                    )
+                    task["signal_values"] = values
+                else:
+                    result = task["pipeline"].run(
+                        executor=self._exec, cancel_event=cancel, **task["kwargs"],
+                    )
+                with self._lock:
+                    task["run_count"] += 1
+                    task["last_result"] = result
+            except Exception as e:
+                logger.error("Scheduler: errore in '%s': %s", name, e)
+            finally:
+                sem.release()
+        finally:
+            with self._lock:
+                task["running"] = False
+                task["cancel"] = None
+                task["last_run"] = time.time()
+                if self._tasks.get(name) is task:
+                    task["next_run"] = time.monotonic() + task["interval"]
+                    heapq.heappush(self._heap, (task["next_run"], name))
+            self._wakeup.set()
 
 
 # ═══════════════════════════════════════════════════════════════════════
 # PIPELINE CONCRETE — workflow predefiniti per Omni Eye AI
 # ═══════════════════════════════════════════════════════════════════════
+# I builder sono memoizzati: ogni chiamata restituisce la stessa istanza
+# (grafo validato una volta sola), bloccata con freeze(). Per modificarla
+# usare Pipeline.copy().
 
+@functools.lru_cache(maxsize=1)
 def build_maintenance_pipeline() -> Pipeline:
     """Pipeline di manutenzione: pulizia upload, log, backup conversazioni.
 
@@ -443,9 +1154,10 @@ def build_maintenance_pipeline() -> Pipeline:
     pipe.add_step(Step("clean_uploads", clean_uploads, on_error="skip"))
     pipe.add_step(Step("trim_logs", trim_logs, on_error="skip"))
     pipe.add_step(Step("backup_kb", backup_knowledge_base, on_error="skip"))
-    return pipe
+    return pipe.freeze()
 
 
+@functools.lru_cache(maxsize=1)
 def build_document_pipeline() -> Pipeline:
     """Pipeline di processing documenti: parse → chunk → index Pilot.
 
@@ -506,9 +1218,27 @@ def build_document_pipeline() -> Pipeline:
         depends_on=["chunk_text"],
         on_error="skip",
     ))
-    return pipe
+    return pipe.freeze()
+
+
+def conversations_signal() -> float:
+    """Segnale "conversations": mtime più recente tra le conversazioni salvate.
+
+    Da passare a PipelineScheduler.register(signals=...) per la memory
+    pipeline, che così non rilegge nulla se non ci sono conversazioni nuove.
+    """
+    import os
+    conv_dir = os.path.join("data", "conversations")
+    if not os.path.isdir(conv_dir):
+        return 0.0
+    with os.scandir(conv_dir) as it:
+        return max(
+            (e.stat().st_mtime for e in it if e.name.endswith(".json") and e.is_file()),
+            default=0.0,
+        )
 
 
+@functools.lru_cache(maxsize=1)
 def build_memory_pipeline() -> Pipeline:
     """Pipeline di manutenzione memoria: entità → KB → compress.
 
@@ -580,6 +1310,8 @@ def build_memory_pipeline() -> Pipeline:
         return updated
 
     pipe = Pipeline("memory_refresh", max_workers=2)
-    pipe.add_step(Step("refresh_entities", refresh_entities, on_error="skip"))
-    pipe.add_step(Step("update_kb", update_knowledge_base, on_error="skip"))
-    return pipe
+    pipe.add_step(Step("refresh_entities", refresh_entities, on_error="skip",
+                       inputs=["conversations"]))
+    pipe.add_step(Step("update_kb", update_knowledge_base, on_error="skip",
+                       inputs=["conversations"]))
+    return pipe.freeze()
@@ -24,12 +24,24 @@ class TestKnowledgeBaseInit(unittest.TestCase):
         self.assertTrue(os.path.exists(path))
 
     def test_tables_exist(self):
-        tables = {r[0] for r in self.kb._conn.execute(
+        needed = {"kv", "topics", "facts"}
+        found = set()
+        for (name,) in self.kb._conn.execute(
             "SELECT name FROM sqlite_master WHERE type IN ('table', 'trigger')"
-        ).fetchall()}
-        self.assertIn("kv", tables)
-        self.assertIn("topics", tables)
-        self.assertIn("facts", tables)
+        ):
+            if name in needed:
+                found.add(name)
+                if found == needed:
+                    break
+        self.assertEqual(found, needed)
+
+    def test_kv_and_topics_without_rowid(self):
+        rows = self.kb._conn.execute(
+            "SELECT name, sql FROM sqlite_master WHERE name IN ('kv', 'topics')"
+        ).fetchall()
+        self.assertEqual(len(rows), 2)
+        for name, sql in rows:
+            self.assertIn("WITHOUT ROWID", sql, name)
 
     def test_fts_virtual_table_exists(self):
         rows = self.kb._conn.execute(
@@ -37,6 +49,13 @@ class TestKnowledgeBaseInit(unittest.TestCase):
         ).fetchall()
         self.assertTrue(len(rows) > 0)
 
+    def test_fts_uses_external_content(self):
+        """Il testo vive solo in facts: niente tabella shadow facts_fts_content."""
+        rows = self.kb._conn.execute(
+            "SELECT name FROM sqlite_master WHERE name='facts_fts_content'"
+        ).fetchall()
+        self.assertEqual(rows, [])
+
     def test_wal_mode(self):
         mode = self.kb._conn.execute("PRAGMA journal_mode").fetchone()[0]
         self.assertEqual(mode, "wal")
@@ -164,6 +183,23 @@ class TestKnowledgeBaseFacts(unittest.TestCase):
         results = self.kb.search_facts("web")
         self.assertEqual(results[0]["source"], "web_search")
 
+    def test_legacy_insert_trigger_dropped(self):
+        """Un DB con il vecchio trigger AFTER INSERT non indicizza due volte."""
+        self.kb._conn.executescript("""
+            CREATE TRIGGER kb_facts_ai AFTER INSERT ON facts BEGIN
+                INSERT INTO facts_fts(rowid, content)
+                VALUES (new.id, new.content);
+            END;
+        """)
+        self.kb.close()
+        self.kb = KnowledgeBase(storage_path=self.tmpdir)
+        triggers = self.kb._conn.execute(
+            "SELECT name FROM sqlite_master WHERE name='kb_facts_ai'"
+        ).fetchall()
+        self.assertEqual(triggers, [])
+        self.kb.add_fact("Fatto unico sugli ornitorinchi")
+        self.assertEqual(len(self.kb.search_facts("ornitorinchi")), 1)
+
 
 class TestKnowledgeBaseSanitizeFTS(unittest.TestCase):
     """Test sanitizzazione query FTS5."""
@@ -347,6 +383,30 @@ class TestKnowledgeBaseUserContext(unittest.TestCase):
         ctx = self.kb.get_user_context()
         self.assertIn("AI", ctx)
 
+    def test_interests_cache_invalidated_on_set(self):
+        self.kb._set_kv("interests", json.dumps(["AI"]))
+        self.assertIn("AI", self.kb.get_user_context())
+        self.kb._set_kv("interests", json.dumps(["scacchi"]))
+        ctx = self.kb.get_user_context()
+        self.assertIn("scacchi", ctx)
+        self.assertNotIn("AI", ctx)
+
+    def test_interests_cache_sees_other_instance(self):
+        """Due istanze sullo stesso DB: nessun interesse perso o stantio."""
+        other = KnowledgeBase(storage_path=self.tmpdir)
+        try:
+            self.kb._set_kv("interests", json.dumps(["AI"]))
+            self.assertIn("AI", self.kb.get_user_context())
+            other.update_from_conversation(
+                [{"role": "user", "content": "Mi piacciono gli scacchi"}])
+            self.assertIn("scacchi", self.kb.get_user_context())
+            self.kb.update_from_conversation(
+                [{"role": "user", "content": "Mi piace la musica"}])
+            interests = json.loads(other._get_kv("interests", "[]"))
+            self.assertEqual(interests, ["AI", "scacchi", "musica"])
+        finally:
+            other.close()
+
     def test_context_with_topics(self):
         self.kb._set_topic("programmazione", 8)
         ctx = self.kb.get_user_context()
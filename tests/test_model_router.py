@@ -88,11 +88,19 @@ class TestModelMapping(unittest.TestCase):
         m = ModelMapping(general="llama3.1", code="llama3.1", vision="minicpm-v")
         self.assertEqual(len(m.all_models()), 2)
 
+    def test_to_dict(self):
+        """Serializzazione per /api/status (la classe ha slots, niente __dict__)."""
+        m = ModelMapping(general="llama3.1", code="codellama:7b", vision="minicpm-v")
+        self.assertEqual(m.to_dict(), {
+            "general": "llama3.1", "code": "codellama:7b", "vision": "minicpm-v",
+        })
+
 
 class TestModelRouter(unittest.TestCase):
     """Verifica il router completo con tracking del warm model."""
 
     def setUp(self):
+        classify_intent.cache_clear()
         self.router = ModelRouter(
             mapping=ModelMapping(
                 general="gemma2:9b",
@@ -133,6 +141,14 @@ class TestModelRouter(unittest.TestCase):
         self.assertEqual(result.model, "llama3.2")
         self.assertTrue(result.fallback_used)
 
+    def test_refresh_installed_invalidates_lookup(self):
+        """Dopo refresh_installed il routing riflette la nuova lista."""
+        self.assertFalse(self.router.route("ciao").fallback_used)
+        self.router.refresh_installed(["llama3.2"])
+        result = self.router.route("ciao")
+        self.assertTrue(result.fallback_used)
+        self.assertEqual(result.model, "llama3.2")
+
     def test_swap_detection(self):
         """Rileva correttamente quando serve uno swap."""
         r1 = self.router.route("ciao")  # gemma2:9b → warm
@@ -2,6 +2,9 @@
 Test per il Pipeline Engine (core/pipeline.py)
 """
 
+import asyncio
+import logging
+import threading
 import time
 import pytest
 from core.pipeline import (
@@ -11,6 +14,16 @@ from core.pipeline import (
 )
 
 
+def _square(**kw):
+    """Top-level (picklable) per gli step executor="process"."""
+    return kw["x"] ** 2
+
+
+def _boom(**kw):
+    """Step che fallisce sempre."""
+    raise RuntimeError("boom")
+
+
 # ── Step basics ──────────────────────────────────────────────────────────
 
 class TestStep:
@@ -46,6 +59,16 @@ class TestPipeline:
         assert results["b"].status == StepStatus.SUCCESS
         assert results["b"].output == 15
 
+    def test_sequential_steps_run_inline(self):
+        """Livelli con un solo step girano sul thread chiamante."""
+        caller = threading.get_ident()
+        pipe = Pipeline("inline")
+        pipe.add_step(Step("a", lambda **kw: threading.get_ident()))
+        pipe.add_step(Step("b", lambda **kw: threading.get_ident(), depends_on=["a"]))
+        results = pipe.run()
+        assert results["a"].output == caller
+        assert results["b"].output == caller
+
     def test_parallel_steps(self):
         """Step B e C dipendono da A → esecuzione parallela."""
         order = []
@@ -75,6 +98,22 @@ class TestPipeline:
         assert results["c"].output == 21
         assert order[0] == "a"  # A eseguito per primo
 
+    def test_child_starts_before_slow_sibling_finishes(self):
+        """Nessuna barriera per livello: d (figlio di c) non aspetta b."""
+        order = []
+
+        def slow(**kw):
+            time.sleep(0.2)
+            order.append("b")
+
+        pipe = Pipeline("no_barrier")
+        pipe.add_step(Step("a", lambda **kw: 1))
+        pipe.add_step(Step("b", slow, depends_on=["a"]))
+        pipe.add_step(Step("c", lambda **kw: order.append("c"), depends_on=["a"]))
+        pipe.add_step(Step("d", lambda **kw: order.append("d"), depends_on=["c"]))
+        pipe.run()
+        assert order.index("d") < order.index("b")
+
     def test_diamond_dag(self):
         """A → B, C → D (diamante)."""
         pipe = Pipeline("diamond")
@@ -85,6 +124,57 @@ class TestPipeline:
         results = pipe.run()
         assert results["d"].output == 5  # 2 + 3
 
+    def test_dispatch_data_cached(self):
+        """Priorità e dipendenze sono calcolate una volta e invalidate da add_step."""
+        pipe = Pipeline("compile")
+        pipe.add_step(Step("a", lambda **kw: 1))
+        pipe.add_step(Step("b", lambda **kw: 2, depends_on=["a"]))
+        pipe.add_step(Step("c", lambda **kw: 3, depends_on=["a"]))
+        pipe._compile()
+        priority, indegree = pipe._priority, pipe._indegree
+        assert priority == [(-2, 0), (-1, 1), (-1, 2)]
+        assert indegree == [0, 1, 1]
+        pipe._compile()
+        assert pipe._priority is priority and pipe._indegree is indegree
+        pipe.add_step(Step("d", lambda **kw: 4, depends_on=["b", "c"]))
+        pipe._compile()
+        assert pipe._priority == [(-3, 0), (-2, 1), (-2, 2), (-1, 3)]
+        assert pipe._indegree == [0, 1, 1, 2]
+
+    def test_critical_path_dispatched_first(self):
+        """Tra gli step pronti parte prima quello con la catena più lunga."""
+        order = []
+        pipe = Pipeline("critical", max_workers=1)
+        pipe.add_step(Step("short", lambda **kw: order.append("short")))
+        pipe.add_step(Step("long1", lambda **kw: order.append("long1")))
+        pipe.add_step(Step("long2", lambda **kw: order.append("long2"), depends_on=["long1"]))
+        pipe.add_step(Step("long3", lambda **kw: order.append("long3"), depends_on=["long2"]))
+        pipe.run()
+        assert order[0] == "long1"
+        idx = pipe._name_to_idx
+        assert pipe._priority[idx["long1"]] < pipe._priority[idx["short"]]
+
+    def test_compiled_dependency_arrays(self):
+        """add_step compila le dipendenze in array CSR indicizzati."""
+        pipe = Pipeline("csr")
+        pipe.add_step(Step("a", lambda **kw: 1))
+        pipe.add_step(Step("b", lambda **kw: 2))
+        pipe.add_step(Step("c", lambda **kw: 3, depends_on=["a", "b"]))
+        assert pipe._name_to_idx == {"a": 0, "b": 1, "c": 2}
+        assert pipe._dep_offsets == [0, 0, 0, 2]
+        assert pipe._dep_flat == [0, 1]
+        assert pipe._children == [[2], [2], []]
+
+    def test_kwargs_include_only_ancestors(self):
+        """Uno step vede gli output degli antenati (anche indiretti), non dei fratelli."""
+        pipe = Pipeline("proj")
+        pipe.add_step(Step("a", lambda **kw: 1))
+        pipe.add_step(Step("b", lambda **kw: 2, depends_on=["a"]))
+        pipe.add_step(Step("c", lambda **kw: sorted(kw), depends_on=["b"]))
+        pipe.add_step(Step("x", lambda **kw: 3, depends_on=["a"]))
+        results = pipe.run(seed=0)
+        assert results["c"].output == ["a", "b", "seed"]
+
     def test_kwargs_passthrough(self):
         """I kwargs iniziali sono accessibili a tutti gli step."""
         pipe = Pipeline("kw")
@@ -110,6 +200,90 @@ class TestPipeline:
         assert result is pipe
 
 
+# ── Executor per step ─────────────────────────────────────────────────
+
+class TestStepExecutor:
+    def test_process_executor(self):
+        pipe = Pipeline("proc")
+        pipe.add_step(Step("sq", _square, executor="process"))
+        pipe.add_step(Step("sq2", _square, executor="process"))
+        try:
+            results = pipe.run(x=7)
+        finally:
+            pipe.close()
+        assert results["sq"].output == 49
+        assert results["sq2"].output == 49
+
+    def test_inline_executor_runs_on_caller_thread(self):
+        caller = threading.get_ident()
+        pipe = Pipeline("inline_exec")
+        pipe.add_step(Step("a", lambda **kw: threading.get_ident(), executor="inline"))
+        pipe.add_step(Step("b", lambda **kw: threading.get_ident(), executor="inline"))
+        results = pipe.run()
+        assert results["a"].output == caller
+        assert results["b"].output == caller
+
+    def test_unpicklable_process_step_fails_cleanly(self):
+        pipe = Pipeline("proc_lambda")
+        pipe.add_step(Step("bad", lambda **kw: 1, executor="process"))
+        pipe.add_step(Step("ok", lambda **kw: 2))
+        try:
+            results = pipe.run()
+        finally:
+            pipe.close()
+        assert results["bad"].status == StepStatus.FAILED
+        assert results["ok"].output == 2
+
+    def test_invalid_executor_raises(self):
+        pipe = Pipeline("bad_exec")
+        with pytest.raises(ValueError, match="executor"):
+            pipe.add_step(Step("x", lambda **kw: 1, executor="gpu"))
+
+
+# ── Memoization step pure ─────────────────────────────────────────────
+
+class TestPureSteps:
+    def test_pure_step_cached_across_runs(self):
+        calls = []
+
+        def square(**kw):
+            calls.append(kw["x"])
+            return kw["x"] ** 2
+
+        pipe = Pipeline("pure")
+        pipe.add_step(Step("sq", square, pure=True))
+        assert pipe.run(x=3)["sq"].output == 9
+        second = pipe.run(x=3)["sq"]
+        assert second.output == 9
+        assert second.duration_ms == 0
+        assert calls == [3]
+        assert pipe.run(x=4)["sq"].output == 16
+        assert calls == [3, 4]
+
+    def test_impure_step_not_cached(self):
+        calls = []
+        pipe = Pipeline("impure")
+        pipe.add_step(Step("s", lambda **kw: calls.append(1)))
+        pipe.run()
+        pipe.run()
+        assert len(calls) == 2
+
+    def test_custom_cache_key_and_lru_eviction(self):
+        calls = []
+
+        def fn(**kw):
+            calls.append(kw["x"])
+            return kw["x"]
+
+        pipe = Pipeline("lru", cache_size=1)
+        pipe.add_step(Step("s", fn, pure=True, cache_key_fn=lambda **kw: kw["x"]))
+        pipe.run(x=1, noise=object())
+        pipe.run(x=1, noise=object())  # stessa chiave custom → hit
+        pipe.run(x=2)                  # evict x=1
+        pipe.run(x=1)
+        assert calls == [1, 2, 1]
+
+
 # ── Retry & Error handling ────────────────────────────────────────────
 
 class TestRetryAndErrors:
@@ -129,6 +303,141 @@ class TestRetryAndErrors:
         assert results["flaky"].status == StepStatus.SUCCESS
         assert results["flaky"].retries_used == 1
 
+    def test_backoff_does_not_hold_worker(self):
+        """Durante il backoff l'unico worker resta libero per altri step."""
+        order = []
+
+        def flaky(**kw):
+            order.append("a")
+            if order.count("a") < 2:
+                raise RuntimeError("transient")
+
+        pipe = Pipeline("backoff", max_workers=1)
+        pipe.add_step(Step("a", flaky, retries=1, backoff=0.2, jitter="none"))
+        pipe.add_step(Step("b", lambda **kw: order.append("b")))
+        pipe.add_step(Step("c", lambda **kw: order.append("c"), depends_on=["b"]))
+        # Stesso cammino critico di b→c: a parte per primo (ordine di inserimento)
+        pipe.add_step(Step("d", lambda **kw: order.append("d"), depends_on=["a"]))
+        results = pipe.run()
+        assert results["a"].status == StepStatus.SUCCESS
+        assert order == ["a", "b", "c", "a", "d"]
+
+    def test_retry_delay_jitter(self):
+        """Backoff esponenziale con tetto; il jitter resta entro i limiti."""
+        none = Step("n", lambda **kw: 1, backoff=1.0, max_backoff=5.0, jitter="none")
+        assert Pipeline._retry_delay(none, 0) == 1.0
+        assert Pipeline._retry_delay(none, 2) == 4.0
+        assert Pipeline._retry_delay(none, 10) == 5.0
+        full = Step("f", lambda **kw: 1, backoff=1.0, jitter="full")
+        equal = Step("e", lambda **kw: 1, backoff=1.0, jitter="equal")
+        for _ in range(50):
+            assert 0.0 <= Pipeline._retry_delay(full, 1) <= 2.0
+            assert 1.0 <= Pipeline._retry_delay(equal, 1) <= 2.0
+
+    def test_cancel_skips_pending_steps(self):
+        pipe = Pipeline("cancel")
+        pipe.add_step(Step("a", lambda **kw: kw.get("stop") and pipe.cancel()))
+        pipe.add_step(Step("b", lambda **kw: 1, depends_on=["a"]))
+        results = pipe.run(stop=True)
+        assert results["a"].status == StepStatus.SUCCESS
+        assert results["b"].status == StepStatus.SKIPPED
+        assert results["b"].error == "Pipeline annullata"
+        # Il run successivo riparte da zero
+        assert pipe.run()["b"].status == StepStatus.SUCCESS
+
+    def test_cancel_does_not_wait_for_running_steps(self):
+        """cancel() durante step paralleli lunghi: run() ritorna subito."""
+        release = threading.Event()
+        pipe = Pipeline("cancel_wait", max_workers=2)
+        pipe.add_step(Step("x", lambda **kw: release.wait(5)))
+        pipe.add_step(Step("y", lambda **kw: release.wait(5)))
+        pipe.add_step(Step("z", lambda **kw: 1, depends_on=["x", "y"]))
+        timer = threading.Timer(0.1, pipe.cancel)
+        timer.start()
+        try:
+            t0 = time.monotonic()
+            results = pipe.run()
+            elapsed = time.monotonic() - t0
+        finally:
+            release.set()
+        assert elapsed < 1.0
+        assert results["z"].status == StepStatus.SKIPPED
+
+    def test_cancel_event_cancels_only_its_run(self):
+        """Stessa istanza da due thread: il cancel_event ferma solo il suo run."""
+        started = threading.Barrier(3)
+        release = threading.Event()
+
+        def gate(**kw):
+            started.wait(2)
+            release.wait(2)
+
+        pipe = Pipeline("concurrent_cancel")
+        pipe.add_step(Step("gate", gate))
+        pipe.add_step(Step("after", lambda **kw: 1, depends_on=["gate"]))
+        stop_a = threading.Event()
+        out = {}
+        runs = [
+            threading.Thread(target=lambda: out.update(a=pipe.run(cancel_event=stop_a))),
+            threading.Thread(target=lambda: out.update(b=pipe.run())),
+        ]
+        for t in runs:
+            t.start()
+        started.wait(2)
+        stop_a.set()
+        release.set()
+        for t in runs:
+            t.join(5)
+        assert out["a"]["after"].status == StepStatus.SKIPPED
+        assert out["b"]["after"].status == StepStatus.SUCCESS
+
+    def test_new_run_does_not_clear_pending_cancel(self):
+        """Un run che parte non azzera il cancel() destinato a un run in corso."""
+        in_gate = threading.Event()
+        release = threading.Event()
+
+        def gate(**kw):
+            if kw.get("first"):
+                in_gate.set()
+                release.wait(2)
+
+        pipe = Pipeline("cancel_then_run")
+        pipe.add_step(Step("gate", gate))
+        pipe.add_step(Step("after", lambda **kw: 1, depends_on=["gate"]))
+        out = {}
+        first = threading.Thread(target=lambda: out.update(a=pipe.run(first=True)))
+        first.start()
+        assert in_gate.wait(2)
+        pipe.cancel()
+        assert pipe.run()["after"].status == StepStatus.SUCCESS
+        release.set()
+        first.join(5)
+        assert out["a"]["after"].status == StepStatus.SKIPPED
+
+    def test_slow_step_warning(self, caplog):
+        pipe = Pipeline("slow", slow_step_ms=10)
+        pipe.add_step(Step("nap", lambda **kw: time.sleep(0.03), executor="inline"))
+        with caplog.at_level(logging.WARNING, logger="core.pipeline"):
+            pipe.run()
+        assert any("nap" in r.getMessage() and "bloccato" in r.getMessage()
+                   for r in caplog.records)
+
+    def test_slow_pooled_step_not_reported(self, caplog):
+        """Step nel pool o eseguiti da soli non bloccano nulla: nessun warning."""
+        pipe = Pipeline("slow_pool", slow_step_ms=10)
+        pipe.add_step(Step("nap1", lambda **kw: time.sleep(0.03)))
+        pipe.add_step(Step("nap2", lambda **kw: time.sleep(0.03)))
+        pipe.add_step(Step("nap3", lambda **kw: time.sleep(0.03),
+                           depends_on=["nap1", "nap2"]))
+        with caplog.at_level(logging.WARNING, logger="core.pipeline"):
+            pipe.run()
+        assert not any("bloccato" in r.getMessage() for r in caplog.records)
+
+    def test_invalid_jitter_raises(self):
+        pipe = Pipeline("jitter")
+        with pytest.raises(ValueError, match="jitter"):
+            pipe.add_step(Step("x", lambda **kw: 1, jitter="random"))
+
     def test_retry_exhausted(self):
         """Step fallisce dopo tutti i retry."""
         def always_fail(**kw):
@@ -153,7 +462,7 @@ class TestRetryAndErrors:
     def test_failed_dependency_skips_child(self):
         """Se A fallisce, B (che dipende da A) viene skippato."""
         pipe = Pipeline("cascade")
-        pipe.add_step(Step("a", lambda **kw: (_ for _ in ()).throw(RuntimeError("boom"))))
+        pipe.add_step(Step("a", _boom))
         pipe.add_step(Step("b", lambda **kw: "never", depends_on=["a"]))
         results = pipe.run()
         assert results["a"].status == StepStatus.FAILED
@@ -172,6 +481,199 @@ class TestDuration:
         pipe.add_step(Step("slow", slow))
         results = pipe.run()
         assert results["slow"].duration_ms >= 40  # almeno ~50ms
+        assert isinstance(results["slow"].duration_ms, int)
+
+
+# ── Esecuzione parziale (run_changed) ──────────────────────────────────
+
+class TestRunChanged:
+    def _pipeline(self, calls):
+        def track(name, value):
+            def fn(**kw):
+                calls.append(name)
+                return value
+            return fn
+
+        pipe = Pipeline("partial")
+        pipe.add_step(Step("uploads", track("uploads", 1), inputs=["uploads_mtime"]))
+        pipe.add_step(Step("logs", track("logs", 2), inputs=["logs_mtime"]))
+        pipe.add_step(Step("report", track("report", 3), depends_on=["logs"],
+                           inputs=["logs_mtime"]))
+        return pipe
+
+    def test_first_call_runs_everything(self):
+        calls = []
+        pipe = self._pipeline(calls)
+        pipe.run_changed(set())
+        assert sorted(calls) == ["logs", "report", "uploads"]
+
+    def test_only_dirty_steps_and_successors_rerun(self):
+        calls = []
+        pipe = self._pipeline(calls)
+        pipe.run()
+        calls.clear()
+        results = pipe.run_changed({"logs_mtime"})
+        assert sorted(calls) == ["logs", "report"]
+        assert results["uploads"].status == StepStatus.SUCCESS
+        assert results["uploads"].output == 1
+        assert results["uploads"].duration_ms == 0
+
+    def test_steps_without_inputs_always_rerun(self):
+        calls = []
+        pipe = self._pipeline(calls)
+        pipe.add_step(Step("misc", lambda **kw: calls.append("misc")))
+        pipe.run()
+        calls.clear()
+        pipe.run_changed(set())
+        assert calls == ["misc"]
+
+    def test_failed_step_reruns(self):
+        attempts = []
+
+        def flaky(**kw):
+            attempts.append(1)
+            if len(attempts) == 1:
+                raise RuntimeError("first")
+            return "ok"
+
+        pipe = Pipeline("partial_fail")
+        pipe.add_step(Step("flaky", flaky, inputs=["x"]))
+        assert pipe.run()["flaky"].status == StepStatus.FAILED
+        assert pipe.run_changed(set())["flaky"].status == StepStatus.SUCCESS
+
+    def test_scheduler_signals(self):
+        calls = []
+        pipe = self._pipeline(calls)
+        state = {"logs_mtime": 1}
+        scheduler = PipelineScheduler()
+        scheduler.register(
+            "partial", pipe, interval_seconds=3600, run_on_start=True,
+            signals={
+                "uploads_mtime": lambda: 0,
+                "logs_mtime": lambda: state["logs_mtime"],
+            },
+        )
+        task = scheduler._tasks["partial"]
+        changed, values = scheduler._changed_signals("partial", task)
+        assert sorted(changed) == ["logs_mtime", "uploads_mtime"]
+        task["signal_values"] = values
+        assert scheduler._changed_signals("partial", task)[0] == []
+        state["logs_mtime"] = 2
+        assert scheduler._changed_signals("partial", task)[0] == ["logs_mtime"]
+
+    def test_signal_change_kept_when_run_fails(self):
+        """Se run_changed solleva, il cambiamento viene riproposto al tick dopo."""
+        calls = []
+        pipe = self._pipeline(calls)
+        pipe.run()
+        scheduler = PipelineScheduler()
+        scheduler.register("partial", pipe, interval_seconds=3600,
+                           signals={"logs_mtime": lambda: 2})
+        task = scheduler._tasks["partial"]
+        task["signal_values"] = {"logs_mtime": 1}
+        sem = threading.Semaphore(1)
+
+        def broken(*args, **kwargs):
+            raise RuntimeError("executor chiuso")
+
+        pipe.run_changed = broken
+        scheduler._run_task("partial", task, sem)
+        assert task["signal_values"] == {"logs_mtime": 1}
+        del pipe.run_changed
+        calls.clear()
+        scheduler._run_task("partial", task, sem)
+        assert sorted(calls) == ["logs", "report"]
+        assert task["signal_values"] == {"logs_mtime": 2}
+
+
+# ── Esecuzione asyncio ─────────────────────────────────────────────────
+
+class TestAsyncPipeline:
+    def test_async_diamond(self):
+        async def a(**kw):
+            return 1
+
+        async def b(**kw):
+            return kw["a"] * 2
+
+        pipe = Pipeline("async_diamond")
+        pipe.add_step(Step("a", a))
+        pipe.add_step(Step("b", b, depends_on=["a"]))
+        pipe.add_step(Step("c", lambda **kw: kw["a"] * 3, depends_on=["a"]))
+        pipe.add_step(Step("d", lambda **kw: kw["b"] + kw["c"], depends_on=["b", "c"]))
+        results = asyncio.run(pipe.run_async())
+        assert results["d"].output == 5
+        assert all(r.status == StepStatus.SUCCESS for r in results.values())
+
+    def test_async_steps_overlap(self):
+        """Step async indipendenti si sovrappongono sull'event loop."""
+        async def nap(**kw):
+            await asyncio.sleep(0.1)
+
+        pipe = Pipeline("async_overlap", max_workers=4)
+        for name in ("x", "y", "z"):
+            pipe.add_step(Step(name, nap))
+        t0 = time.perf_counter()
+        asyncio.run(pipe.run_async())
+        assert time.perf_counter() - t0 < 0.25
+
+    def test_async_cancel_does_not_wait(self):
+        async def long(**kw):
+            await asyncio.sleep(5)
+
+        async def main():
+            asyncio.get_running_loop().call_later(0.1, pipe.cancel)
+            return await pipe.run_async()
+
+        pipe = Pipeline("async_cancel")
+        pipe.add_step(Step("long", long))
+        pipe.add_step(Step("after", lambda **kw: 1, depends_on=["long"]))
+        t0 = time.perf_counter()
+        results = asyncio.run(main())
+        assert time.perf_counter() - t0 < 1.0
+        assert results["after"].status == StepStatus.SKIPPED
+
+    def test_semaphore_limits_concurrency(self):
+        async def nap(**kw):
+            await asyncio.sleep(0.05)
+
+        pipe = Pipeline("async_limited", max_workers=1)
+        pipe.add_step(Step("x", nap))
+        pipe.add_step(Step("y", nap))
+        t0 = time.perf_counter()
+        asyncio.run(pipe.run_async())
+        assert time.perf_counter() - t0 >= 0.1
+
+    def test_async_failure_skips_child_and_retries(self):
+        calls = []
+
+        async def flaky(**kw):
+            calls.append(1)
+            if len(calls) < 2:
+                raise RuntimeError("transient")
+            return "ok"
+
+        async def broken(**kw):
+            raise RuntimeError("boom")
+
+        pipe = Pipeline("async_errors")
+        pipe.add_step(Step("flaky", flaky, retries=1, backoff=0.01))
+        pipe.add_step(Step("broken", broken))
+        pipe.add_step(Step("child", lambda **kw: 1, depends_on=["broken"]))
+        results = asyncio.run(pipe.run_async())
+        assert results["flaky"].status == StepStatus.SUCCESS
+        assert results["flaky"].retries_used == 1
+        assert results["broken"].status == StepStatus.FAILED
+        assert results["child"].status == StepStatus.SKIPPED
+
+    def test_async_timeout(self):
+        async def hang(**kw):
+            await asyncio.sleep(1)
+
+        pipe = Pipeline("async_timeout")
+        pipe.add_step(Step("hang", hang, timeout=0.05))
+        results = asyncio.run(pipe.run_async())
+        assert results["hang"].status == StepStatus.FAILED
 
 
 # ── Scheduler ──────────────────────────────────────────────────────────
@@ -196,6 +698,95 @@ class TestScheduler:
         time.sleep(0.1)
         scheduler.stop()
 
+    def test_stop_is_prompt(self):
+        """stop() risveglia subito il thread, senza attendere la deadline."""
+        scheduler = PipelineScheduler()
+        pipe = Pipeline("idle")
+        pipe.add_step(Step("noop", lambda **kw: None))
+        scheduler.register("idle", pipe, interval_seconds=3600)
+        scheduler.start()
+        time.sleep(0.05)
+        t0 = time.monotonic()
+        scheduler.stop()
+        assert time.monotonic() - t0 < 1.0
+
+    def test_register_after_start_wakes_loop(self):
+        scheduler = PipelineScheduler()
+        scheduler.start()
+        pipe = Pipeline("late")
+        pipe.add_step(Step("fast", lambda **kw: 1))
+        scheduler.register("late", pipe, interval_seconds=3600, run_on_start=True)
+        time.sleep(0.3)
+        scheduler.stop()
+        assert scheduler.get_status()["late"]["run_count"] == 1
+
+    def test_pool_limits_concurrency(self):
+        """Due task nello stesso pool da 1 slot non girano mai insieme."""
+        active = [0]
+        peak = [0]
+        lock = threading.Lock()
+
+        def busy(**kw):
+            with lock:
+                active[0] += 1
+                peak[0] = max(peak[0], active[0])
+            time.sleep(0.1)
+            with lock:
+                active[0] -= 1
+
+        scheduler = PipelineScheduler()
+        for name in ("one", "two"):
+            pipe = Pipeline(name)
+            pipe.add_step(Step("busy", busy))
+            scheduler.register(name, pipe, interval_seconds=3600,
+                               run_on_start=True, pool="disk", slots=1)
+        scheduler.start()
+        time.sleep(0.5)
+        scheduler.stop()
+        status = scheduler.get_status()
+        assert status["one"]["run_count"] == 1
+        assert status["two"]["run_count"] == 1
+        assert status["one"]["pool"] == "disk"
+        assert peak[0] == 1
+
+    def test_stop_cancels_running_pipeline(self):
+        """stop() annulla la pipeline in corso: gli step successivi sono SKIPPED."""
+        started = threading.Event()
+
+        def slow(**kw):
+            started.set()
+            time.sleep(0.3)
+
+        pipe = Pipeline("long")
+        pipe.add_step(Step("slow", slow))
+        pipe.add_step(Step("after", lambda **kw: 1, depends_on=["slow"]))
+        scheduler = PipelineScheduler()
+        scheduler.register("long", pipe, interval_seconds=3600, run_on_start=True)
+        scheduler.start()
+        assert started.wait(2)
+        scheduler.stop()
+        time.sleep(0.5)
+        result = scheduler.get_status()["long"]["last_result"]
+        assert result["after"] == "skipped"
+
+    def test_steps_use_shared_executor(self):
+        """Gli step paralleli girano sul thread pool dello scheduler."""
+        def who(**kw):
+            time.sleep(0.05)
+            return threading.current_thread().name
+
+        pipe = Pipeline("shared")
+        pipe.add_step(Step("x", who))
+        pipe.add_step(Step("y", who))
+        scheduler = PipelineScheduler()
+        scheduler.register("shared", pipe, interval_seconds=3600, run_on_start=True)
+        scheduler.start()
+        time.sleep(0.4)
+        scheduler.stop()
+        result = scheduler._tasks["shared"]["last_result"]
+        assert result["x"].output.startswith("pipeline-step")
+        assert result["y"].output.startswith("pipeline-step")
+
     def test_run_on_start(self):
         scheduler = PipelineScheduler()
         pipe = Pipeline("immediate")
@@ -234,6 +825,24 @@ class TestPipelineBuilders:
         assert "refresh_entities" in pipe._steps
         assert "update_kb" in pipe._steps
 
+    def test_builders_are_memoized(self):
+        assert build_document_pipeline() is build_document_pipeline()
+        assert build_memory_pipeline() is build_memory_pipeline()
+
+    def test_builders_are_frozen(self):
+        shared = build_memory_pipeline()
+        with pytest.raises(RuntimeError, match="copy"):
+            shared.add_step(Step("extra", lambda **kw: 1))
+        assert "extra" not in shared._steps
+
+    def test_copy_is_independent(self):
+        shared = build_maintenance_pipeline()
+        clone = shared.copy()
+        clone.add_step(Step("extra", lambda **kw: 1, depends_on=["trim_logs"]))
+        assert "extra" in clone._steps
+        assert "extra" not in shared._steps
+        assert clone._steps["trim_logs"].fn is shared._steps["trim_logs"].fn
+
     def test_maintenance_pipeline_runs(self):
         """La maintenance pipeline deve girare senza errori (anche se non c'è nulla da pulire)."""
         pipe = build_maintenance_pipeline()
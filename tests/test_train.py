@@ -0,0 +1,202 @@
+"""
+Test per l'export dei dati di training (train.py)
+"""
+
+import json
+import logging
+import os
+
+import pytest
+
+import config
+import train
+from train import OmniTrainer
+
+
+def _conversation(turns: int, content: str = "testo") -> dict:
+    """Conversazione con un system, `turns` coppie user/assistant e un tool."""
+    messages = [{"role": "system", "content": "sys"}]
+    for i in range(turns):
+        messages.append({"role": "user", "content": f"domanda {i} {content}"})
+        messages.append({"role": "assistant", "content": f"risposta {i}", "extra": 1})
+    messages.append({"role": "tool", "content": "ignorato"})
+    return {"id": "conv", "messages": messages}
+
+
+@pytest.fixture
+def trainer(tmp_path):
+    t = OmniTrainer()
+    t.conversations_dir = str(tmp_path / "conversations")
+    t.data_dir = str(tmp_path)
+    (tmp_path / "conversations").mkdir()
+    return t
+
+
+def _write(trainer, name: str, conv) -> None:
+    path = f"{trainer.conversations_dir}/{name}"
+    with open(path, "w", encoding="utf-8") as f:
+        f.write(conv if isinstance(conv, str) else json.dumps(conv))
+
+
+def _read_jsonl(path) -> list:
+    with open(path, encoding="utf-8") as f:
+        return [json.loads(line) for line in f]
+
+
+@pytest.fixture(params=[False, True], ids=["json", "orjson"])
+def orjson_mode(request, monkeypatch):
+    """Esegue il test con e senza orjson (se installato)."""
+    if request.param:
+        pytest.importorskip("orjson")
+    monkeypatch.setattr(train, "ORJSON_AVAILABLE", request.param)
+    return request.param
+
+
+@pytest.mark.usefixtures("orjson_mode")
+class TestExportTrainingData:
+    def test_chatml(self, trainer, tmp_path):
+        _write(trainer, "a.json", _conversation(2, "è così"))
+        out = tmp_path / "out.jsonl"
+        assert trainer.export_training_data(output=str(out)) == 1
+        (example,) = _read_jsonl(out)
+        messages = example["messages"]
+        assert messages[0] == {"role": "system", "content": config.SYSTEM_PROMPT}
+        assert [m["role"] for m in messages[1:]] == [
+            "user", "assistant", "user", "assistant",
+        ]
+        assert messages[1] == {"role": "user", "content": "domanda 0 è così"}
+        assert messages[2] == {"role": "assistant", "content": "risposta 0"}
+
+    def test_alpaca(self, trainer, tmp_path):
+        _write(trainer, "a.json", _conversation(3))
+        out = tmp_path / "out.jsonl"
+        assert trainer.export_training_data(output=str(out), format="alpaca") == 3
+        examples = _read_jsonl(out)
+        assert examples[0] == {
+            "instruction": "domanda 0 testo", "input": "", "output": "risposta 0",
+        }
+        assert [e["output"] for e in examples] == [
+            "risposta 0", "risposta 1", "risposta 2",
+        ]
+
+    def test_min_turns_rejects_short_conversations(self, trainer, tmp_path):
+        _write(trainer, "short.json", _conversation(1))
+        _write(trainer, "long.json", _conversation(2))
+        out = tmp_path / "out.jsonl"
+        assert trainer.export_training_data(output=str(out), min_turns=2) == 1
+        (example,) = _read_jsonl(out)
+        assert len(example["messages"]) == 5
+
+    def test_malformed_file_skipped_with_warning(self, trainer, tmp_path, caplog):
+        _write(trainer, "bad.json", '{"messages": [{"role": ')
+        _write(trainer, "good.json", _conversation(2))
+        out = tmp_path / "out.jsonl"
+        with caplog.at_level(logging.WARNING, logger="train"):
+            assert trainer.export_training_data(output=str(out)) == 1
+        assert any("bad.json" in r.getMessage() for r in caplog.records)
+        assert len(_read_jsonl(out)) == 1
+
+    def test_large_file_read(self, trainer, tmp_path):
+        """File oltre _MMAP_MIN_BYTES (mmap con orjson)."""
+        _write(trainer, "big.json", _conversation(2, "x" * train._MMAP_MIN_BYTES))
+        out = tmp_path / "out.jsonl"
+        assert trainer.export_training_data(output=str(out)) == 1
+
+    def test_process_pool_path(self, trainer, tmp_path):
+        n = train._PARALLEL_MIN_FILES + 2
+        for i in range(n):
+            _write(trainer, f"c{i:03d}.json", _conversation(2, f"c{i:03d}"))
+        _write(trainer, "short.json", _conversation(1))
+        out = tmp_path / "out.jsonl"
+        assert trainer.export_training_data(output=str(out), format="alpaca") == 2 * n
+        # Con il pool l'output segue l'ordine dei file elencati
+        expected = [
+            f"domanda {t} {name[:-len('.json')]}"
+            for name in map(os.path.basename, trainer._list_conv_files())
+            if name != "short.json"
+            for t in range(2)
+        ]
+        assert [e["instruction"] for e in _read_jsonl(out)] == expected
+
+    def test_missing_directory(self, trainer, tmp_path):
+        trainer.conversations_dir = str(tmp_path / "assente")
+        out = tmp_path / "out.jsonl"
+        assert trainer.export_training_data(output=str(out)) == 0
+        assert _read_jsonl(out) == []
+
+
+class TestCleanMessages:
+    def test_early_reject_stops_building(self):
+        """Scarto appena i messaggi rimasti non bastano: il resto non è letto."""
+        class Guard(dict):
+            def get(self, key, default=None):
+                raise AssertionError("messaggio letto dopo lo scarto")
+
+        messages = [
+            {"role": "system", "content": "sys"},
+            {"role": "tool", "content": "t"},
+            Guard(),
+        ]
+        assert train._clean_messages(messages, needed=2) is None
+
+    def test_short_list_rejected_without_scan(self):
+        assert train._clean_messages([{"role": "user", "content": "x"}], needed=2) is None
+
+    def test_needed_reached(self):
+        conv = _conversation(2)
+        clean = train._clean_messages(conv["messages"], head=("h",), needed=4)
+        assert clean[0] == "h"
+        assert [m["role"] for m in clean[1:]] == ["user", "assistant"] * 2
+
+    def test_needed_not_reached_at_end(self):
+        conv = _conversation(1)
+        assert train._clean_messages(conv["messages"], needed=4) is None
+
+    def test_without_needed_accepts_iterators(self):
+        conv = _conversation(1)
+        clean = train._clean_messages(iter(conv["messages"]))
+        assert len(clean) == 2
+
+
+class TestBenchmark:
+    def test_missing_zero_metrics_count_as_zero(self, monkeypatch):
+        """Metriche omesse dal server (valore 0) non fanno fallire il run."""
+        import httpx
+        import ollama
+
+        class FakeAsyncClient:
+            def __init__(self, host=None):
+                pass
+
+            async def __aenter__(self):
+                return self
+
+            async def __aexit__(self, *exc):
+                return False
+
+            async def chat(self, **kwargs):
+                # prompt_eval_duration assente, come nelle risposte reali
+                return ollama.ChatResponse(
+                    message={"role": "assistant", "content": "ok"},
+                    eval_count=50, eval_duration=500_000_000,
+                    total_duration=600_000_000,
+                )
+
+        real_http = httpx.AsyncClient
+
+        def fake_http(**kwargs):
+            body = b'{"message":{"content":"x"}}\n{"message":{"content":""},"done":true}\n'
+            transport = httpx.MockTransport(lambda request: httpx.Response(200, content=body))
+            return real_http(transport=transport, **kwargs)
+
+        monkeypatch.setattr(train.ollama, "AsyncClient", FakeAsyncClient)
+        monkeypatch.setattr(train.httpx, "AsyncClient", fake_http)
+        results = OmniTrainer().benchmark_model(
+            "fake", prompts={"general": "ciao"}, runs=2,
+        )
+        assert results["general"] == {
+            "avg_time": 0.6,
+            "avg_tokens": 50,
+            "tokens_per_sec": 100.0,
+            "time_to_first_token_ms": 0,
+        }
@@ -11,6 +11,7 @@ Strumenti per:
 Uso:
     python train.py create              Crea modelli personalizzati omni-chat e omni-coder
     python train.py create --model X    Crea solo il modello X
+    python train.py create --parallel-create  Crea i modelli in parallelo
     python train.py export              Esporta conversazioni in JSONL per fine-tuning
     python train.py export -f alpaca    Esporta in formato Alpaca
     python train.py benchmark           Benchmark di tutti i modelli
@@ -19,15 +20,21 @@ Uso:
     python train.py all                 Esegui tutto
 """
 
+import asyncio
 import json
+import mmap
 import os
 import sys
 import time
-import glob
 import argparse
+import functools
 import subprocess
 import platform
+import statistics
 import logging
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
+from functools import partial
+from types import MappingProxyType
 
 # Aggiungi il percorso del progetto
 sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
@@ -36,19 +43,158 @@ import config
 
 try:
     import ollama
+    import httpx  # trasporto HTTP usato da ollama (sua dipendenza)
 except ImportError:
     print("❌ Pacchetto 'ollama' non installato. Esegui: pip install ollama")
     sys.exit(1)
 
+# orjson (opzionale): parser JSON SIMD in Rust, ~3-5x più veloce di json
+try:
+    import orjson
+    ORJSON_AVAILABLE = True
+except ImportError:
+    orjson = None
+    ORJSON_AVAILABLE = False
+
+# ijson (opzionale): parsing incrementale per conversazioni enormi
+try:
+    import ijson
+    IJSON_AVAILABLE = True
+except ImportError:
+    ijson = None
+    IJSON_AVAILABLE = False
+
 logging.basicConfig(level=logging.INFO, format='%(message)s')
 logger = logging.getLogger(__name__)
 
+# Sotto questa soglia di file il parsing resta nel processo corrente:
+# avviare il pool costerebbe più del parsing stesso.
+_PARALLEL_MIN_FILES = 64
+# Sotto una pagina il setup di mmap costa più di una read()
+_MMAP_MIN_BYTES = 4096
+# Oltre questa dimensione i messaggi vengono letti in streaming con ijson,
+# senza materializzare l'intero albero JSON in memoria
+_STREAM_MIN_BYTES = 10 << 20
+
+# Errori che rendono una conversazione illeggibile (non fatali per l'export).
+# orjson.JSONDecodeError è sottoclasse di json.JSONDecodeError.
+_PARSE_ERRORS = (json.JSONDecodeError, KeyError)
+if IJSON_AVAILABLE:
+    _PARSE_ERRORS += (ijson.JSONError,)
+
+
+# System prompt di omni-coder: composto una sola volta all'import
+_CODER_SYSTEM = (
+    f"{config.SYSTEM_PROMPT}\n\n# Modalità Codice\n"
+    "Sei specializzato in programmazione. Rispondi con codice pulito, "
+    "commentato e funzionante. Usa sempre code block Markdown con il "
+    "linguaggio specificato. Preferisci soluzioni idiomatiche."
+)
+
+
+def _parse_conv(path: str, min_turns: int, head: tuple = ()) -> tuple:
+    """Legge una conversazione e ne estrae i soli messaggi user/assistant.
+
+    Funzione di modulo (picklable) per ProcessPoolExecutor.
+
+    Args:
+        head: messaggi da anteporre (es. il system prompt per ChatML), così
+            la lista restituita è già quella finale dell'esempio
+
+    Returns:
+        (clean, errore): clean è None se la conversazione ha meno di
+        min_turns turni o non è leggibile (in quel caso errore è valorizzato)
+    """
+    try:
+        with open(path, 'rb') as f:
+            size = os.fstat(f.fileno()).st_size
+            if IJSON_AVAILABLE and size > _STREAM_MIN_BYTES:
+                # Memoria costante: un messaggio alla volta
+                messages = ijson.items(f, 'messages.item')
+                clean = _clean_messages(messages, head)
+                # Con lo streaming la lunghezza non è nota: controllo a fine lettura
+                if len(clean) - len(head) < min_turns * 2:
+                    clean = None
+            else:
+                if ORJSON_AVAILABLE and size >= _MMAP_MIN_BYTES:
+                    # orjson legge direttamente dalla mappatura, senza copie
+                    with mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as mm, \
+                            memoryview(mm) as view:
+                        conv = orjson.loads(view)
+                elif ORJSON_AVAILABLE:
+                    conv = orjson.loads(f.read())
+                else:
+                    conv = json.loads(f.read())
+                # Lista già in memoria: scarto anticipato appena i messaggi
+                # rimasti non bastano più a raggiungere min_turns
+                clean = _clean_messages(conv.get('messages', []), head,
+                                        needed=min_turns * 2)
+    except _PARSE_ERRORS as e:
+        return None, str(e)
+    return clean, None
+
+
+def _clean_messages(messages, head: tuple = (), needed: int = 0):
+    """Filtra solo i messaggi user/assistant (escludi system/tool).
+
+    Un solo passaggio: i messaggi filtrati vengono accodati a head
+    senza liste intermedie.
+
+    Args:
+        needed: messaggi user/assistant minimi richiesti; se > 0 messages
+            deve essere una sequenza (serve len) e la costruzione si
+            interrompe appena i messaggi rimasti non possono più bastare
+
+    Returns:
+        La lista filtrata, oppure None se needed non è raggiungibile
+    """
+    out = list(head)
+    append = out.append
+    if not needed:
+        for m in messages:
+            role = m.get('role')
+            if role == 'user' or role == 'assistant':
+                append({"role": role, "content": m['content']})
+        return out
+    left = len(messages)
+    if left < needed:
+        return None
+    # Invariante: missing <= left; solo un messaggio scartato riduce il margine
+    missing = needed
+    for m in messages:
+        left -= 1
+        role = m.get('role')
+        if role == 'user' or role == 'assistant':
+            append({"role": role, "content": m['content']})
+            missing -= 1
+        elif left < missing:
+            return None
+    return out
+
+
+def _jsonl_line(obj: dict) -> bytes:
+    """Serializza un esempio come riga JSONL (UTF-8, newline finale)."""
+    if ORJSON_AVAILABLE:
+        return orjson.dumps(
+            obj, option=orjson.OPT_APPEND_NEWLINE | orjson.OPT_NON_STR_KEYS,
+        )
+    return (json.dumps(obj, ensure_ascii=False) + '\n').encode('utf-8')
+
+
+def _frozen(obj):
+    """Copia di sola lettura (ricorsiva) di un dict di configurazione."""
+    if isinstance(obj, dict):
+        return MappingProxyType({k: _frozen(v) for k, v in obj.items()})
+    return obj
+
 
 class OmniTrainer:
     """Toolkit per training, ottimizzazione e benchmark dei modelli Omni Eye AI."""
 
     # ── Definizione modelli personalizzati ────────────────────────────
-    MODELFILES = {
+    # Sola lettura (anche spec e params annidati): il testo dei Modelfile
+    # è memoizzato per nome
+    MODELFILES = _frozen({
         'omni-chat': {
             'base': 'gemma3:4b',
             'system': config.SYSTEM_PROMPT,
@@ -64,13 +210,7 @@ class OmniTrainer:
         },
         'omni-coder': {
             'base': 'qwen2.5-coder:7b',
-            'system': (
-                config.SYSTEM_PROMPT
-                + "\n\n# Modalità Codice\n"
-                "Sei specializzato in programmazione. Rispondi con codice pulito, "
-                "commentato e funzionante. Usa sempre code block Markdown con il "
-                "linguaggio specificato. Preferisci soluzioni idiomatiche."
-            ),
+            'system': _CODER_SYSTEM,
             'params': {
                 'temperature': 0.3,
                 'num_ctx': 8192,
@@ -81,7 +221,10 @@ class OmniTrainer:
                 'top_p': 0.95,
             },
         },
-    }
+    })
+
+    # Validità (s) della lista modelli installati in cache
+    INSTALLED_TTL = 5.0
 
     # ── Prompt di benchmark ──────────────────────────────────────────
     BENCH_PROMPTS = {
@@ -104,14 +247,32 @@ class OmniTrainer:
         self.client = ollama.Client(host=config.OLLAMA_HOST)
         self.conversations_dir = config.CONVERSATIONS_DIR
         self.data_dir = config.DATA_DIR
+        self._installed_cache = None
+        self._installed_at = 0.0
+
+    def _installed(self) -> list:
+        """Modelli installati in Ollama, con cache di INSTALLED_TTL secondi.
+
+        Evita una seconda chiamata HTTP (e il parsing del catalogo) quando
+        info e benchmark girano uno dopo l'altro, come nel comando 'all'.
+        Le eccezioni del client vengono propagate al chiamante.
+        """
+        now = time.monotonic()
+        if (self._installed_cache is None
+                or now - self._installed_at >= self.INSTALLED_TTL):
+            self._installed_cache = self.client.list().models
+            self._installed_at = now
+        return self._installed_cache
 
     # ══════════════════════════════════════════════════════════════════
     # 1. CREAZIONE MODELLI PERSONALIZZATI
     # ══════════════════════════════════════════════════════════════════
 
-    def _generate_modelfile(self, name: str) -> str:
-        """Genera il contenuto del Modelfile per un modello personalizzato."""
-        spec = self.MODELFILES[name]
+    @staticmethod
+    @functools.lru_cache(maxsize=8)
+    def _generate_modelfile(name: str) -> str:
+        """Genera (una volta per nome) il Modelfile di un modello personalizzato."""
+        spec = OmniTrainer.MODELFILES[name]
         lines = [f"FROM {spec['base']}", ""]
 
         # System prompt (triple-quoted per gestire caratteri speciali)
@@ -147,10 +308,11 @@ class OmniTrainer:
         logger.info("   📄 Modelfile salvato: %s", modelfile_path)
 
         try:
-            start = time.perf_counter()
+            start_ns = time.perf_counter_ns()
             # Crea il modello in Ollama — usa il contenuto come stringa
             self.client.create(model=name, modelfile=modelfile_content)
-            elapsed = time.perf_counter() - start
+            self._installed_cache = None  # la lista modelli è cambiata
+            elapsed = (time.perf_counter_ns() - start_ns) / 1e9
             logger.info(
                 "   ✅ Modello '%s' creato con successo! (%.1fs)", name, elapsed,
             )
@@ -159,15 +321,26 @@ class OmniTrainer:
             logger.error("   ❌ Errore creazione modello '%s': %s", name, e)
             return False
 
-    def create_all_models(self) -> dict:
-        """Crea tutti i modelli personalizzati definiti."""
+    def create_all_models(self, parallel: bool = False) -> dict:
+        """Crea tutti i modelli personalizzati definiti.
+
+        Args:
+            parallel: crea i modelli in contemporanea (ogni create è
+                indipendente lato server). Disattivato di default: su
+                sistemi con poca VRAM/disco lento le build concorrenti
+                possono rallentarsi a vicenda.
+        """
         logger.info("=" * 60)
         logger.info("🏗️  CREAZIONE MODELLI PERSONALIZZATI")
         logger.info("=" * 60)
 
-        results = {}
-        for name in self.MODELFILES:
-            results[name] = self.create_model(name)
+        names = list(self.MODELFILES)
+        if parallel:
+            # ollama.Client fa chiamate HTTP senza stato: thread-safe
+            with ThreadPoolExecutor(max_workers=len(names)) as pool:
+                results = dict(zip(names, pool.map(self.create_model, names)))
+        else:
+            results = {name: self.create_model(name) for name in names}
 
         # Riepilogo
         logger.info("\n" + "=" * 60)
@@ -191,6 +364,23 @@ class OmniTrainer:
     # 2. EXPORT DATI DI TRAINING
     # ══════════════════════════════════════════════════════════════════
 
+    def _list_conv_files(self) -> list:
+        """Percorsi dei file .json delle conversazioni salvate.
+
+        os.scandir restituisce il tipo di file già dalla lettura della
+        directory: nessuna stat() per voce, a differenza di glob.
+        """
+        try:
+            with os.scandir(self.conversations_dir) as it:
+                return [
+                    e.path for e in it
+                    # Come glob('*.json'): esclusi i file nascosti
+                    if e.name.endswith('.json') and not e.name.startswith('.')
+                    and e.is_file(follow_symlinks=False)
+                ]
+        except FileNotFoundError:
+            return []
+
     def export_training_data(
         self,
         output: str = None,
@@ -215,70 +405,73 @@ class OmniTrainer:
         logger.info("   Min turni:  %d", min_turns)
         logger.info("   Output:     %s", output)
 
-        conv_files = glob.glob(os.path.join(self.conversations_dir, '*.json'))
+        conv_files = self._list_conv_files()
         logger.info("   Conversazioni trovate: %d", len(conv_files))
 
-        examples = []
+        exported = 0
         skipped = 0
 
-        for conv_file in conv_files:
-            try:
-                with open(conv_file, 'r', encoding='utf-8') as f:
-                    conv = json.load(f)
-
-                messages = conv.get('messages', [])
-                # Filtra solo user/assistant (escludi system/tool)
-                clean = [
-                    m for m in messages
-                    if m.get('role') in ('user', 'assistant')
-                ]
-
-                if len(clean) < min_turns * 2:
-                    skipped += 1
-                    continue
-
-                if format == 'chatml':
-                    # ChatML: {"messages": [{"role":..., "content":...}]}
-                    example = {
-                        "messages": [
-                            {"role": "system", "content": config.SYSTEM_PROMPT},
-                            *[
-                                {"role": m['role'], "content": m['content']}
-                                for m in clean
-                            ],
-                        ]
-                    }
-                    examples.append(example)
-
-                elif format == 'alpaca':
-                    # Alpaca: ogni coppia user/assistant → un esempio
-                    for i in range(0, len(clean) - 1, 2):
-                        if (clean[i]['role'] == 'user'
-                                and clean[i + 1]['role'] == 'assistant'):
-                            example = {
-                                "instruction": clean[i]['content'],
-                                "input": "",
-                                "output": clean[i + 1]['content'],
-                            }
-                            examples.append(example)
-
-            except (json.JSONDecodeError, KeyError) as e:
-                logger.warning("   ⚠️ Errore parsing %s: %s", conv_file, e)
-                skipped += 1
-
-        # Scrivi JSONL
+        # Parsing JSON (CPU-bound) in parallelo su più processi; qui resta
+        # solo l'assemblaggio degli esempi, scritti su disco man mano che i
+        # worker restituiscono i risultati (nessuna lista completa in RAM).
+        # Per ChatML il system prompt è anteposto già dal worker: la lista
+        # restituita è direttamente il campo "messages" dell'esempio.
+        system_msg = {"role": "system", "content": config.SYSTEM_PROMPT}
+        parse = partial(
+            _parse_conv, min_turns=min_turns,
+            head=(system_msg,) if format == 'chatml' else (),
+        )
+        pool = (
+            ProcessPoolExecutor() if len(conv_files) >= _PARALLEL_MIN_FILES
+            else None
+        )
         os.makedirs(os.path.dirname(output) or '.', exist_ok=True)
-        with open(output, 'w', encoding='utf-8') as f:
-            for ex in examples:
-                f.write(json.dumps(ex, ensure_ascii=False) + '\n')
+        try:
+            parsed = (
+                pool.map(parse, conv_files, chunksize=64) if pool
+                else map(parse, conv_files)
+            )
+            # Lookup ripetuti per ogni esempio portati fuori dal loop
+            to_line = _jsonl_line
+            with open(output, 'wb', buffering=1 << 20) as f:
+                write = f.write
+                for conv_file, (clean, error) in zip(conv_files, parsed):
+                    if clean is None:
+                        if error:
+                            logger.warning(
+                                "   ⚠️ Errore parsing %s: %s", conv_file, error,
+                            )
+                        skipped += 1
+                        continue
+
+                    if format == 'chatml':
+                        # ChatML: {"messages": [{"role":..., "content":...}]}
+                        # (clean contiene già system + role/content)
+                        write(to_line({"messages": clean}))
+                        exported += 1
+
+                    elif format == 'alpaca':
+                        # Alpaca: ogni coppia user/assistant → un esempio
+                        it = iter(clean)
+                        for user, assistant in zip(it, it):
+                            if user['role'] == 'user' and assistant['role'] == 'assistant':
+                                write(to_line({
+                                    "instruction": user['content'],
+                                    "input": "",
+                                    "output": assistant['content'],
+                                }))
+                                exported += 1
+        finally:
+            if pool is not None:
+                pool.shutdown()
 
         logger.info(
             "\n   ✅ Esportati %d esempi (%d conversazioni saltate)",
-            len(examples), skipped,
+            exported, skipped,
         )
         logger.info("   📁 File: %s", output)
 
-        if examples:
+        if exported:
             logger.info("\n💡 Per fine-tuning, usa uno di questi strumenti:")
             logger.info(
                 "   • Unsloth (consigliato, veloce): "
@@ -295,7 +488,7 @@ class OmniTrainer:
             logger.info("\n   Dopo il fine-tuning, converti in GGUF e importa:")
             logger.info("   ollama create mio-modello -f Modelfile")
 
-        return len(examples)
+        return exported
 
     # ══════════════════════════════════════════════════════════════════
     # 3. BENCHMARK INFERENZA
@@ -315,73 +508,134 @@ class OmniTrainer:
         logger.info("\n   📊 Benchmark: %s", model)
         logger.info("   " + "-" * 50)
 
-        for prompt_type, prompt in prompts.items():
-            times = []
-            token_counts = []
-            first_token_times = []
-
-            for run_i in range(runs):
-                try:
-                    start = time.perf_counter()
-                    first_token_time = None
-                    tokens = 0
-
-                    stream = self.client.chat(
-                        model=model,
-                        messages=[
-                            {
-                                "role": "system",
-                                "content": "Rispondi in italiano, in modo conciso.",
-                            },
-                            {"role": "user", "content": prompt},
-                        ],
-                        stream=True,
-                        options={
-                            'num_predict': 256,
-                            'num_ctx': 4096,
-                            'temperature': 0.7,
-                        },
-                    )
-
-                    for chunk in stream:
-                        if 'message' in chunk and chunk['message'].get('content'):
-                            tokens += 1
-                            if first_token_time is None:
-                                first_token_time = time.perf_counter() - start
-
-                    elapsed = time.perf_counter() - start
-                    times.append(elapsed)
-                    token_counts.append(tokens)
-                    if first_token_time:
-                        first_token_times.append(first_token_time)
-
-                except Exception as e:
-                    logger.warning("      ⚠️ Run %d fallito: %s", run_i + 1, e)
-
-            if times:
-                avg_time = sum(times) / len(times)
-                avg_tokens = sum(token_counts) / len(token_counts)
-                avg_tps = avg_tokens / avg_time if avg_time > 0 else 0
-                avg_ttft = (
-                    sum(first_token_times) / len(first_token_times)
-                    if first_token_times else 0
-                )
+        measured = asyncio.run(self._benchmark_runs(model, prompts, runs))
+
+        for prompt_type, samples in measured.items():
+            if samples:
+                # Metriche misurate dal server Ollama (ns interi, non da
+                # Python): somme intere, conversione di unità una volta sola
+                total_eval = sum(s['eval_count'] for s in samples)
+                total_eval_ns = sum(s['eval_duration'] for s in samples)
+                avg_time = statistics.fmean(
+                    s['total_duration'] for s in samples
+                ) / 1e9
+                avg_tokens = total_eval / len(samples)
+                avg_tps = total_eval * 1e9 / total_eval_ns if total_eval_ns else 0
+                avg_ttft_ms = statistics.fmean(
+                    s['prompt_eval_duration'] for s in samples
+                ) / 1e6
 
                 results[prompt_type] = {
                     'avg_time': round(avg_time, 2),
                     'avg_tokens': round(avg_tokens),
                     'tokens_per_sec': round(avg_tps, 1),
-                    'time_to_first_token_ms': round(avg_ttft * 1000),
+                    'time_to_first_token_ms': round(avg_ttft_ms),
                 }
 
                 logger.info(
                     "      %-10s  %.1f tok/s  |  TTFT: %4dms  |  %d tok in %.1fs",
-                    prompt_type, avg_tps, avg_ttft * 1000,
+                    prompt_type, avg_tps, avg_ttft_ms,
                     int(avg_tokens), avg_time,
                 )
 
         return results
 
+    async def _benchmark_runs(self, model: str, prompts: dict, runs: int) -> dict:
+        """Esegue tutti i run di benchmark in modo asincrono.
+
+        Un primo run in streaming fa da warm-up: carica il modello in VRAM
+        (così il caricamento non sporca le medie) e misura il TTFT percepito
+        dall'utente. I run misurati usano stream=False e i contatori del
+        server (eval_count, *_duration in ns).
+
+        Le richieste si sovrappongono fino a OLLAMA_NUM_PARALLEL (quante il
+        server ne serve davvero in parallelo): oltre quel limite finirebbero
+        solo in coda lato Ollama, falsando tempi e TTFT.
+
+        Returns:
+            Dict prompt_type → lista di metriche del server per i soli run
+            riusciti
+        """
+        parallel = max(1, int(os.environ.get('OLLAMA_NUM_PARALLEL') or 1))
+        sem = asyncio.Semaphore(parallel)
+        options = {
+            'num_predict': 256,
+            'num_ctx': 4096,
+            'temperature': 0.7,
+        }
+
+        def _messages(prompt: str) -> list:
+            return [
+                {"role": "system", "content": "Rispondi in italiano, in modo conciso."},
+                {"role": "user", "content": prompt},
+            ]
+
+        # Warm-up in streaming (escluso dalle medie). Va direttamente su
+        # /api/chat: il primo token si riconosce sulla riga NDJSON grezza,
+        # senza il parsing e gli oggetti di risposta del client per ogni
+        # chunk, che finirebbero dentro il TTFT misurato. Timestamp interi
+        # (ns); dopo il primo token lo stream viene solo consumato.
+        payload = {
+            'model': model,
+            'messages': _messages(next(iter(prompts.values()))),
+            'stream': True,
+            'options': options,
+        }
+        try:
+            async with httpx.AsyncClient(
+                base_url=config.OLLAMA_HOST, timeout=None,
+            ) as http:
+                start_ns = time.perf_counter_ns()
+                ttft_ns = 0
+                async with http.stream('POST', '/api/chat', json=payload) as resp:
+                    resp.raise_for_status()
+                    lines = resp.aiter_lines()
+                    async for line in lines:
+                        if '"content":"' in line and '"content":""' not in line:
+                            ttft_ns = time.perf_counter_ns() - start_ns
+                            break
+                    async for _ in lines:
+                        pass
+            if ttft_ns:
+                logger.info(
+                    "      warm-up     TTFT streaming: %dms (incluso caricamento)",
+                    ttft_ns // 1_000_000,
+                )
+        except Exception as e:
+            logger.warning("      ⚠️ Warm-up fallito: %s", e)
+
+        # AsyncClient creato e chiuso qui: il suo pool di connessioni è
+        # legato all'event loop di asyncio.run(), che termina con questa
+        # chiamata.
+        async with ollama.AsyncClient(host=config.OLLAMA_HOST) as client:
+
+            async def _one_run(prompt: str, run_i: int):
+                async with sem:
+                    try:
+                        resp = await client.chat(
+                            model=model, messages=_messages(prompt),
+                            stream=False, options=options,
+                        )
+                        # Ollama omette le metriche a zero (omitempty):
+                        # .get() invece di [] che solleverebbe KeyError
+                        return {
+                            key: resp.get(key) or 0
+                            for key in ('eval_count', 'eval_duration',
+                                        'prompt_eval_duration', 'total_duration')
+                        }
+                    except Exception as e:
+                        logger.warning("      ⚠️ Run %d fallito: %s", run_i + 1, e)
+                        return None
+
+            gathered = await asyncio.gather(*(
+                asyncio.gather(*(_one_run(prompt, i) for i in range(runs)))
+                for prompt in prompts.values()
+            ))
+        return {
+            prompt_type: [s for s in samples if s is not None]
+            for prompt_type, samples in zip(prompts, gathered)
+        }
+
     def benchmark_all(self, runs: int = 3) -> dict:
         """Benchmark di tutti i modelli configurati."""
         logger.info("\n" + "=" * 60)
@@ -398,7 +652,7 @@ class OmniTrainer:
 
         # Verifica modelli installati
         try:
-            installed = [m.model for m in self.client.list().models]
+            installed = [m.model for m in self._installed()]
         except Exception:
             installed = []
 
@@ -421,13 +675,11 @@ class OmniTrainer:
         logger.info("  " + "-" * 48)
         for model, results in all_results.items():
             if results:
-                avg_tps = (
-                    sum(r['tokens_per_sec'] for r in results.values())
-                    / len(results)
+                avg_tps = statistics.fmean(
+                    r['tokens_per_sec'] for r in results.values()
                 )
-                avg_ttft = (
-                    sum(r['time_to_first_token_ms'] for r in results.values())
-                    / len(results)
+                avg_ttft = statistics.fmean(
+                    r['time_to_first_token_ms'] for r in results.values()
                 )
                 logger.info(
                     "  %-25s  %7.1f  %6.0fms", model, avg_tps, avg_ttft,
@@ -473,21 +725,28 @@ class OmniTrainer:
                 logger.info("   export %s=%s  # %s", key, val, descriptions[key])
             return
 
-        # Windows: usa setx per persistenza
+        # Windows: un solo processo PowerShell imposta tutte le variabili
+        # utente persistenti (un setx per chiave costa un CreateProcess ognuno)
+        script = ";".join(
+            f"[Environment]::SetEnvironmentVariable('{key}','{val}','User')"
+            for key, val in env_vars.items()
+        )
+        try:
+            subprocess.run(
+                ['powershell', '-NoProfile', '-Command', script],
+                capture_output=True, text=True, check=True,
+            )
+        except (OSError, subprocess.CalledProcessError) as e:
+            logger.error("   ❌ Impostazione variabili fallita: %s",
+                         getattr(e, 'stderr', None) or e)
+            return
+
         for key, val in env_vars.items():
-            current = os.environ.get(key)
-            try:
-                subprocess.run(
-                    ['setx', key, val],
-                    capture_output=True, text=True, check=True,
-                )
-                status = "aggiornato" if current != val else "confermato"
-                logger.info(
-                    "   ✅ %s = %s  (%s — %s)",
-                    key, val, status, descriptions[key],
-                )
-            except subprocess.CalledProcessError as e:
-                logger.error("   ❌ %s: %s", key, e.stderr.strip())
+            status = "aggiornato" if os.environ.get(key) != val else "confermato"
+            logger.info(
+                "   ✅ %s = %s  (%s — %s)",
+                key, val, status, descriptions[key],
+            )
 
         logger.info("\n   ⚠️  Riavvia Ollama per applicare le modifiche:")
         logger.info("   → Chiudi Ollama dalla system tray, poi riaprilo")
@@ -504,7 +763,7 @@ class OmniTrainer:
 
         # Modelli installati
         try:
-            models = self.client.list().models
+            models = self._installed()
             logger.info("\n   Modelli installati:")
             for m in models:
                 size_gb = getattr(m, 'size', 0) / (1024 ** 3)
@@ -540,7 +799,7 @@ class OmniTrainer:
             logger.info("      %s = %s", key, val)
 
         # Conversazioni
-        conv_files = glob.glob(os.path.join(self.conversations_dir, '*.json'))
+        conv_files = self._list_conv_files()
         logger.info("\n   Conversazioni salvate: %d", len(conv_files))
 
         # Baked models
@@ -565,6 +824,7 @@ Esempi:
   python train.py info                  Mostra info sistema e configurazione
   python train.py create               Crea modelli personalizzati
   python train.py create --model X     Crea solo il modello X
+  python train.py create --parallel-create  Crea i modelli in parallelo
   python train.py export               Esporta dati per fine-tuning (ChatML)
   python train.py export -f alpaca     Esporta in formato Alpaca
   python train.py benchmark            Benchmark di tutti i modelli
@@ -583,6 +843,10 @@ Esempi:
     create_p.add_argument(
         '--model', help='Nome modello specifico (omni-chat, omni-coder)',
     )
+    create_p.add_argument(
+        '--parallel-create', action='store_true',
+        help='Crea i modelli in parallelo',
+    )
 
     # export
     export_p = subparsers.add_parser('export', help='Esporta dati di training')
@@ -612,9 +876,13 @@ Esempi:
     )
 
     # all
-    subparsers.add_parser(
+    all_p = subparsers.add_parser(
         'all', help='Esegui tutto (optimize + create + export + benchmark)',
     )
+    all_p.add_argument(
+        '--parallel-create', action='store_true',
+        help='Crea i modelli in parallelo',
+    )
 
     args = parser.parse_args()
 
@@ -631,7 +899,7 @@ Esempi:
         if args.model:
             trainer.create_model(args.model)
         else:
-            trainer.create_all_models()
+            trainer.create_all_models(parallel=args.parallel_create)
 
     elif args.command == 'export':
         trainer.export_training_data(
@@ -652,7 +920,7 @@ Esempi:
     elif args.command == 'all':
         trainer.show_info()
         trainer.optimize_ollama()
-        trainer.create_all_models()
+        trainer.create_all_models(parallel=args.parallel_create)
         trainer.export_training_data()
         trainer.benchmark_all()
 